@@ -0,0 +1,82 @@
+"""
+CoinGecko prices fetched in shared, batched upstream calls.
+
+simple/price accepts a comma-separated list of coin ids, so PriceBatcher
+collects the ids that concurrent requests ask for during a short window
+and fetches them all in one call; every waiting request then picks its
+own coin out of the reply. Combined with the per-coin cache entries in
+web_dashboard, N viewers of M coins cost at most one upstream call per
+window instead of N x M.
+"""
+
+import threading
+
+import upstream
+
+PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+COALESCE_WINDOW = 0.05  # seconds a batch stays open for more ids
+MAX_IDS = 100           # ids per upstream call
+
+
+class UnknownCoin(KeyError):
+    pass
+
+
+def fetch_prices(ids):
+    """{id: {'usd': ..., 'usd_24h_change': ...}} for the ids CoinGecko knows"""
+    return upstream.get_json(PRICE_URL, ids=",".join(ids), vs_currencies='usd',
+                             include_24hr_change='true')
+
+
+class Batch:
+    def __init__(self):
+        self.ids = set()
+        self.done = threading.Event()
+        self.prices = {}
+        self.error = None
+
+
+class PriceBatcher:
+    def __init__(self, fetch=fetch_prices, window=COALESCE_WINDOW, max_ids=MAX_IDS):
+        self.fetch = fetch
+        self.window = window
+        self.max_ids = max_ids
+        self.lock = threading.Lock()
+        self.batch = None           # the batch still accepting ids
+        self.requests = self.calls = 0
+
+    def get(self, coin):
+        """Price data for one coin, fetched together with the others asked for in the window"""
+        with self.lock:
+            self.requests += 1
+            batch = self.batch
+            if batch is None or len(batch.ids) >= self.max_ids:
+                batch = self.batch = Batch()
+                timer = threading.Timer(self.window, self._flush, args=(batch,))
+                timer.daemon = True
+                timer.start()
+            batch.ids.add(coin)
+
+        if not batch.done.wait(self.window + upstream.TIMEOUT):
+            raise TimeoutError(f"No price for {coin}")
+        if batch.error is not None:
+            raise batch.error
+        if coin not in batch.prices:
+            raise UnknownCoin(coin)
+        return batch.prices[coin]
+
+    def _flush(self, batch):
+        with self.lock:
+            if self.batch is batch:
+                self.batch = None
+            self.calls += 1
+        try:
+            batch.prices = self.fetch(sorted(batch.ids))
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'upstream_calls': self.calls}
@@ -0,0 +1,182 @@
+"""
+In-process cache for the dashboard's upstream APIs.
+
+Entries expire after a per-entry TTL and the least recently used entry
+is evicted once the cache is full. Concurrent misses for the same key
+are coalesced ("single flight"): the first caller fetches, the others
+wait for its result, so a burst of identical requests costs one
+upstream call. Failures are never cached.
+
+An entry may also be kept for a while past its TTL (stale-while-revalidate):
+a stale hit is answered at once from the old value while one background
+fetch refreshes it, and if the upstream is down the old value keeps being
+served until that window runs out. Refresher re-fetches registered hot
+keys shortly before they expire, so their readers never wait at all.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 1024
+WAIT_TIMEOUT = 30       # seconds a coalesced caller waits for the fetch it joined
+REFRESH_LEAD = 0.8      # hot keys are re-fetched after this fraction of their TTL
+RETRY_DELAY = 15        # seconds before a failed hot-key refresh is retried
+
+class Flight:
+    """A fetch in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # key -> (fresh_until, stale_until, value), least recently used first
+        self.entries = OrderedDict()
+        self.flights = {}               # key -> Flight
+        self.hits = self.stale_hits = self.misses = self.coalesced = self.errors = 0
+
+    def _entry(self, key):
+        """(fresh_until, stale_until, value) or None, dropping dead entries (lock held)"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        """Fresh value for `key` (stale ones don't count)"""
+        with self.lock:
+            entry = self._entry(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[2]
+
+    def set(self, key, value, ttl, stale=0):
+        if ttl <= 0:
+            return
+        fresh_until = time.monotonic() + ttl
+        with self.lock:
+            self.entries[key] = (fresh_until, fresh_until + stale, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _fetch(self, key, flight, fetch, ttl, stale):
+        """Run a flight's fetch and publish the outcome to its waiters"""
+        try:
+            flight.value = fetch()
+            self.set(key, flight.value, ttl, stale)
+        except Exception as e:
+            flight.error = e
+            with self.lock:
+                self.errors += 1
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def get_or_fetch(self, key, fetch, ttl, stale=0):
+        """Cached value for `key`, calling fetch() at most once per miss across threads.
+
+        A value up to `stale` seconds past its TTL is returned immediately
+        while a background fetch replaces it; a failed refresh leaves it
+        in place.
+        """
+        with self.lock:
+            entry = self._entry(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[2]
+            flight = self.flights.get(key)
+            if entry is not None:
+                self.stale_hits += 1
+                if flight is None:
+                    flight = self.flights[key] = Flight()
+                    threading.Thread(target=self._fetch, args=(key, flight, fetch, ttl, stale),
+                                     daemon=True).start()
+                return entry[2]
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._fetch(key, flight, fetch, ttl, stale)
+        elif not flight.done.wait(WAIT_TIMEOUT):
+            raise TimeoutError(f"Timed out waiting for {key!r}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def refresh(self, key, fetch, ttl, stale=0):
+        """Fetch `key` now (or join the fetch in flight); True if it succeeded"""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if leader:
+            self._fetch(key, flight, fetch, ttl, stale)
+        else:
+            flight.done.wait(WAIT_TIMEOUT)
+        return flight.done.is_set() and flight.error is None
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'stale_hits': self.stale_hits,
+                    'misses': self.misses, 'coalesced': self.coalesced, 'errors': self.errors}
+
+
+class Refresher:
+    """Background thread keeping registered hot keys fresh in a TTLCache"""
+
+    def __init__(self, cache, lead=REFRESH_LEAD, retry_delay=RETRY_DELAY):
+        self.cache = cache
+        self.lead = lead
+        self.retry_delay = retry_delay
+        self.jobs = {}                  # key -> (fetch, ttl, stale)
+        self.schedule = []              # heap of (due, tiebreak, key)
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def add(self, key, fetch, ttl, stale=0):
+        """Keep `key` fresh from now on (its first fetch happens right away)"""
+        with self.condition:
+            known = key in self.jobs
+            self.jobs[key] = (fetch, ttl, stale)
+            if known:
+                return
+            heapq.heappush(self.schedule, (time.monotonic(), next(self.order), key))
+            self.condition.notify()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="cache-refresher", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.schedule or self.schedule[0][0] > time.monotonic():
+                    self.condition.wait(self.schedule[0][0] - time.monotonic() if self.schedule else None)
+                _, _, key = heapq.heappop(self.schedule)
+                fetch, ttl, stale = self.jobs[key]
+            delay = ttl * self.lead
+            if not self.cache.refresh(key, fetch, ttl, stale):
+                delay = min(delay, self.retry_delay)
+            with self.condition:
+                heapq.heappush(self.schedule, (time.monotonic() + delay, next(self.order), key))
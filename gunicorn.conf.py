@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for web_dashboard (Procfile: gunicorn -c gunicorn.conf.py web_dashboard:app)
+
+With gevent installed each worker is cooperative: a request waiting on an
+upstream API yields to the others, so one process serves hundreds of
+requests at once instead of one. Without gevent it falls back to threads,
+and web_dashboard then turns its live-update stream (/api/stream) off,
+since every open stream would hold one of those threads.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = 30
+
+try:
+    import gevent  # noqa: F401  (only checking it is installed)
+except ImportError:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('THREADS', 8))
+else:
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Asyncio Engine for the Multi-Service Server
+Runs the chat, UDP info and file services on one event loop instead of
+one thread per connection, so a single process can hold 10k+ idle chat
+clients. The wire protocol is exactly the one spoken by the threaded engine.
+
+File transfers are accepted on the loop but streamed by a small worker
+pool: their bodies move with sendfile()/recv_into() on blocking sockets,
+which must not stall chat traffic.
+"""
+import asyncio
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import framing
+from framing import FrameDecoder, read_frame
+from broadcast import Outbox, next_conn_id
+from udp_batch import BatchedUDP, PacketStats
+from metrics import METRICS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import CHAT_PORT, INFO_PORT, FILE_PORT
+
+BACKLOG = 1024
+FILE_WORKERS = 32
+LAG_PROBE = 0.25    # seconds between event-loop lag probes
+ACCEPT_BACKOFF = 0.1  # seconds to pause accepting after an accept() error (e.g. EMFILE)
+
+
+def raise_fd_limit():
+    """Lift the soft open-file limit to the hard limit (one fd per client)"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+class StreamClient:
+    """Chat stream with its own outbox, drained by a writer task"""
+
+    def __init__(self, writer, outbox_limit, policy):
+        self.writer = writer
+        self.conn_id = next_conn_id()
+        self.channels = set()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.wakeup = asyncio.Event()
+        self.outbox = Outbox(outbox_limit, policy, notify=self.notify)
+        self.task = self.loop.create_task(self.write_loop())
+
+    def notify(self):
+        if threading.get_ident() == self.loop_thread:
+            self.wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def send(self, frame):
+        """Queue a direct reply (never dropped)"""
+        self.outbox.put(frame, force=True)
+
+    def deliver(self, frame):
+        """Queue a broadcast; False means the slow-consumer policy says disconnect"""
+        return self.outbox.put(frame)
+
+    async def write_loop(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                batch = self.outbox.take(block=False)
+                if batch:
+                    data = b"".join(batch)
+                    self.writer.write(data)
+                    METRICS.inc("chat_bytes_out", len(data))
+                    # Only this client's task waits for its socket to drain
+                    await self.writer.drain()
+                if self.outbox.closed:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.writer.close()
+
+    def close(self):
+        """Stop the writer and drop the connection (safe from any thread)"""
+        self.outbox.close()
+        if threading.get_ident() == self.loop_thread:
+            self.writer.transport.abort()
+        else:
+            self.loop.call_soon_threadsafe(self.writer.transport.abort)
+
+
+class AsyncioEngine:
+    def __init__(self, server, file_workers=FILE_WORKERS):
+        self.server = server
+        self.file_workers = file_workers
+        self.file_pool = ThreadPoolExecutor(max_workers=file_workers,
+                                            thread_name_prefix="file")
+        self.file_jobs = 0      # queued + running on the pool (touched on the loop only)
+        self.loop_lag = 0.0
+        METRICS.gauge("file_pool_jobs", lambda: self.file_jobs,
+                      "File transfers queued or running on the worker pool")
+        METRICS.gauge("file_pool_workers", lambda: self.file_workers, "File worker pool size")
+        METRICS.gauge("event_loop_lag_last_seconds", lambda: self.loop_lag,
+                      "How late the last event-loop lag probe woke up")
+        METRICS.describe("event_loop_lag_seconds", "Event-loop wakeup delay")
+        METRICS.describe("file_accept_errors", "File connections that failed to accept (e.g. out of fds)")
+
+    async def handle_chat_client(self, reader, writer):
+        """Handle individual chat client"""
+        addr = writer.get_extra_info("peername")
+        client = StreamClient(writer, self.server.outbox_limit, self.server.slow_policy)
+        METRICS.inc("chat_connections")
+        username = None
+        decoder = FrameDecoder(framing.CHAT_MAX_PAYLOAD)
+        try:
+            client.send(framing.encode_frame(framing.USERNAME))
+            frame = await read_frame(reader, decoder)
+            if frame is None:
+                return
+            username = frame[1].decode().strip()
+            self.server.join_chat(client, username, addr)
+
+            while self.server.running:
+                frame = await read_frame(reader, decoder)
+                if frame is None:
+                    break
+                self.server.handle_chat_frame(client, username, *frame)
+        except (ConnectionError, ValueError, framing.FrameError):   # UnicodeDecodeError is a ValueError
+            pass
+        finally:
+            self.server.leave_chat(client, username)
+            client.close()
+
+    async def file_acceptor(self, sock):
+        """Accept file connections and stream them on the worker pool"""
+        loop = asyncio.get_running_loop()
+        while self.server.running:
+            try:
+                client, addr = await loop.sock_accept(sock)
+            except OSError as e:
+                # Out of file descriptors and the like: keep the other services up
+                print(f"❌ File accept failed: {e}")
+                METRICS.inc("file_accept_errors")
+                await asyncio.sleep(ACCEPT_BACKOFF)
+                continue
+            client.setblocking(True)
+            self.file_jobs += 1
+            job = loop.run_in_executor(self.file_pool, self.server.handle_file_client, client, addr)
+            job.add_done_callback(self.file_job_done)
+
+    def file_job_done(self, job):
+        self.file_jobs -= 1
+
+    async def watch_loop_lag(self):
+        """Saturation probe: how late does a timer fire on a busy loop?"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE)
+            self.loop_lag = max(0.0, loop.time() - start - LAG_PROBE)
+            METRICS.observe("event_loop_lag_seconds", self.loop_lag)
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+
+        chat_sock = self.server.bind_socket(socket.SOCK_STREAM, CHAT_PORT, BACKLOG)
+        chat = await asyncio.start_server(self.handle_chat_client, sock=chat_sock)
+        print(f"📱 TCP Chat Server running on port {CHAT_PORT}")
+        # UDP info: each readiness callback drains a whole batch of datagrams
+        info_sock = self.server.bind_socket(socket.SOCK_DGRAM, INFO_PORT)
+        info_sock.setblocking(False)
+        stats = PacketStats("UDP info")
+        self.server.info_stats.append(stats)
+        info = BatchedUDP(info_sock, self.server.info_datagram, stats, self.server.udp_batch)
+        loop.add_reader(info_sock.fileno(), info.drain)
+        print(f"📊 UDP Info Server running on port {INFO_PORT}")
+        file_sock = self.server.bind_socket(socket.SOCK_STREAM, FILE_PORT, BACKLOG)
+        file_sock.setblocking(False)
+        print(f"📁 TCP File Server running on port {FILE_PORT}")
+
+        self.server.print_banner()
+        try:
+            async with chat:
+                await asyncio.gather(chat.serve_forever(), self.file_acceptor(file_sock),
+                                     self.watch_loop_lag())
+        finally:
+            loop.remove_reader(info_sock.fileno())
+            info_sock.close()
+            file_sock.close()
+            self.file_pool.shutdown(wait=False)
+
+    def run(self):
+        raise_fd_limit()
+        asyncio.run(self.serve())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Broadcast Fan-Out Helpers
+A broadcast is encoded once and the same bytes object is queued on every
+recipient's Outbox. Each client has its own writer (a thread or an asyncio
+task, depending on the engine) that drains its outbox, joining everything
+queued into one send. A slow reader therefore only ever fills its own
+queue; what happens when that queue is full is the slow-consumer policy:
+
+    drop        discard the oldest queued message
+    coalesce    discard the oldest queued message and tell the client how
+                many it missed, so it can catch up with SINCE
+    disconnect  close the connection
+"""
+import itertools
+import threading
+from collections import deque
+
+import framing
+from framing import chat_payload, encode_frame
+
+DROP = "drop"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+POLICIES = (DROP, COALESCE, DISCONNECT)
+
+OUTBOX_LIMIT = 256
+
+# Process-wide connection ids, used to exclude a sender from its own broadcast
+next_conn_id = itertools.count(1).__next__
+
+
+class Outbox:
+    """Bounded, thread-safe queue of encoded frames for one client"""
+
+    def __init__(self, limit=OUTBOX_LIMIT, policy=COALESCE, notify=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow-consumer policy {policy!r}")
+        self.frames = deque()
+        self.limit = limit
+        self.policy = policy
+        self.notify = notify      # called after every change (asyncio wakeup)
+        self.closed = False
+        self.dropped = 0          # total messages discarded by the policy
+        self._skipped = 0         # discarded since the last coalesce notice
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame, force=False):
+        """Queue a frame; returns False if the client must be disconnected.
+
+        `force` bypasses the limit for direct replies (history, catch-up),
+        which the client asked for and must not be dropped.
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            if not force and len(self.frames) >= self.limit:
+                if self.policy == DISCONNECT:
+                    self.closed = True
+                    self._cond.notify()
+                    return False
+                self.frames.popleft()
+                self.dropped += 1
+                if self.policy == COALESCE:
+                    self._skipped += 1
+            self.frames.append(frame)
+            self._cond.notify()
+        if self.notify:
+            self.notify()
+        return True
+
+    def take(self, block=True):
+        """Remove and return everything queued ([] once closed and empty)"""
+        with self._cond:
+            while block and not self.frames and not self.closed:
+                self._cond.wait()
+            batch = list(self.frames)
+            self.frames.clear()
+            skipped, self._skipped = self._skipped, 0
+        if skipped:
+            notice = f"⚠️ {skipped} messages skipped (slow connection) - use /since to catch up"
+            batch.insert(0, encode_frame(framing.MSG, chat_payload(0, "", notice)))
+        return batch
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        if self.notify:
+            self.notify()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Sharded Channel Registry
+Chat clients subscribe to named channels (rooms). Channels are spread over
+a fixed number of shards by a stable hash of the name, and each shard has
+its own lock, so busy rooms on different shards never contend and a
+broadcast only walks the subscribers of its own channel.
+"""
+import threading
+import zlib
+
+DEFAULT_CHANNEL = "general"
+SHARDS = 16
+MAX_NAME = 64
+
+
+def valid_channel(name):
+    return 0 < len(name) <= MAX_NAME and "\0" not in name and not name.isspace()
+
+
+class Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}    # channel name -> {client: username}
+
+
+class ChannelRegistry:
+    def __init__(self, shards=SHARDS):
+        self.shards = [Shard() for _ in range(shards)]
+
+    def shard(self, channel):
+        return self.shards[zlib.crc32(channel.encode()) % len(self.shards)]
+
+    def join(self, channel, client, username):
+        """Subscribe client; returns False if it was already a member"""
+        shard = self.shard(channel)
+        with shard.lock:
+            members = shard.channels.setdefault(channel, {})
+            if client in members:
+                return False
+            members[client] = username
+            return True
+
+    def leave(self, channel, client):
+        """Unsubscribe client; returns False if it was not a member"""
+        shard = self.shard(channel)
+        with shard.lock:
+            members = shard.channels.get(channel)
+            if not members or members.pop(client, None) is None:
+                return False
+            if not members:
+                del shard.channels[channel]
+            return True
+
+    def members(self, channel):
+        """Snapshot of the clients subscribed to channel"""
+        shard = self.shard(channel)
+        with shard.lock:
+            return list(shard.channels.get(channel, ()))
+
+    def usernames(self, channel):
+        shard = self.shard(channel)
+        with shard.lock:
+            return list(shard.channels.get(channel, {}).values())
+
+    def counts(self):
+        """{channel: subscriber count} across all shards"""
+        counts = {}
+        for shard in self.shards:
+            with shard.lock:
+                counts.update((name, len(members)) for name, members in shard.channels.items())
+        return counts
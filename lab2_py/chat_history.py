@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Bounded Chat History Store
+Recent messages live in a fixed-size ring buffer; everything is also
+appended to an on-disk log split into segment files. Older messages are
+read back through mmap only when a client asks for them, so memory stays
+bounded no matter how long the server runs.
+
+Every message gets a sequence number (1, 2, 3, ...). Clients remember the
+last one they saw and ask for "messages since N" after reconnecting.
+Messages belong to a channel; queries can be limited to a set of channels.
+
+Segment record layout: seq (8 bytes) | length (4 bytes) | channel NUL text
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+RECORD = struct.Struct("!QI")
+INDEX_EVERY = 64          # sparse index: one entry per 64 records
+SEGMENT_BYTES = 4 * 1024 * 1024
+MAX_SEGMENTS = 16
+CATCHUP_LIMIT = 1000
+
+
+def _unpack(data):
+    channel, _, text = data.decode(errors="replace").partition("\0")
+    return channel, text
+
+
+class Segment:
+    """One append-only log file holding a contiguous run of sequence numbers"""
+
+    def __init__(self, path, first_seq):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = first_seq - 1
+        self.size = 0
+        self.index = []   # (seq, byte offset) every INDEX_EVERY records
+
+    def note(self, seq, offset, length):
+        if (seq - self.first_seq) % INDEX_EVERY == 0:
+            self.index.append((seq, offset))
+        self.last_seq = seq
+        self.size = offset + RECORD.size + length
+
+    @classmethod
+    def load(cls, path):
+        """Rebuild the index of an existing segment, dropping a torn tail"""
+        first_seq = int(os.path.basename(path).split(".")[0])
+        segment = cls(path, first_seq)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for seq, offset, length in segment._records(mm, 0):
+                        segment.note(seq, offset, length)
+        if os.path.getsize(path) != segment.size:
+            os.truncate(path, segment.size)
+        return segment
+
+    @staticmethod
+    def _records(mm, offset):
+        while offset + RECORD.size <= len(mm):
+            seq, length = RECORD.unpack_from(mm, offset)
+            if offset + RECORD.size + length > len(mm):
+                return
+            yield seq, offset, length
+            offset += RECORD.size + length
+
+    def read(self, from_seq, limit, channels=None):
+        """Return up to `limit` (seq, channel, text) entries with seq >= from_seq"""
+        if not self.size:
+            return []
+        start = bisect.bisect_right(self.index, (from_seq, float("inf"))) - 1
+        offset = self.index[start][1] if start >= 0 else 0
+        out = []
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for seq, pos, length in self._records(mm, offset):
+                    if seq >= from_seq:
+                        body = pos + RECORD.size
+                        channel, text = _unpack(mm[body:body + length])
+                        if channels is not None and channel not in channels:
+                            continue
+                        out.append((seq, channel, text))
+                        if len(out) >= limit:
+                            break
+        return out
+
+
+class ChatHistory:
+    """Ring buffer of recent messages backed by an optional segment log"""
+
+    def __init__(self, capacity=1000, log_dir=None, segment_bytes=SEGMENT_BYTES,
+                 max_segments=MAX_SEGMENTS, max_age=None):
+        self.ring = deque(maxlen=capacity)
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.max_age = max_age      # seconds, None = keep by count only
+        self.last_seq = 0
+        self.segments = []
+        self._log = None
+        self._lock = threading.Lock()
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        """Total number of messages ever recorded"""
+        return self.last_seq
+
+    def _load(self):
+        names = sorted(n for n in os.listdir(self.log_dir) if n.endswith(".log"))
+        self.segments = [Segment.load(os.path.join(self.log_dir, n)) for n in names]
+        if self.segments:
+            self.last_seq = max(s.last_seq for s in self.segments)
+            self._log = open(self.segments[-1].path, "ab")
+            self.ring.extend(self._read_segments(self.last_seq - self.ring.maxlen + 1,
+                                                 self.ring.maxlen, self.segments))
+
+    def _roll(self, first_seq):
+        """Start a new segment and enforce the retention policy"""
+        if self._log:
+            self._log.close()
+        path = os.path.join(self.log_dir, f"{first_seq:020d}.log")
+        self.segments.append(Segment(path, first_seq))
+        self._log = open(path, "ab")
+        now = time.time()
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            expired = self.max_age and now - os.path.getmtime(oldest.path) > self.max_age
+            if len(self.segments) <= self.max_segments and not expired:
+                break
+            self.segments.pop(0)
+            try:
+                os.remove(oldest.path)
+            except FileNotFoundError:
+                pass
+
+    def append(self, text, channel="", seq=None):
+        """Record a message and return its sequence number.
+
+        `seq` is given when numbering is done elsewhere (the cluster relay).
+        """
+        data = f"{channel}\0{text}".encode()
+        with self._lock:
+            if seq is None:
+                seq = self.last_seq + 1
+            self.last_seq = seq
+            self.ring.append((seq, channel, text))
+            if self.log_dir:
+                if not self.segments or self.segments[-1].size >= self.segment_bytes:
+                    self._roll(seq)
+                segment = self.segments[-1]
+                offset = segment.size
+                self._log.write(RECORD.pack(seq, len(data)) + data)
+                self._log.flush()
+                segment.note(seq, offset, len(data))
+        return seq
+
+    def recent(self, count, channels=None):
+        """Last `count` messages as (seq, channel, text) entries"""
+        with self._lock:
+            if channels is None:
+                return list(islice(self.ring, max(0, len(self.ring) - count), None))
+            matches = []
+            for entry in reversed(self.ring):
+                if len(matches) >= count:
+                    break
+                if entry[1] in channels:
+                    matches.append(entry)
+            return matches[::-1]
+
+    def since(self, seq, limit=CATCHUP_LIMIT, channels=None):
+        """Messages with sequence number > seq, oldest first (at most `limit`)"""
+        from_seq = seq + 1
+        with self._lock:
+            if (self.ring and self.ring[0][0] <= from_seq) or not self.segments:
+                # Served from memory (without a log the ring is all we have)
+                skip = max(0, from_seq - self.ring[0][0]) if self.ring else 0
+                entries = islice(self.ring, skip, None)
+                if channels is not None:
+                    entries = (entry for entry in entries if entry[1] in channels)
+                return list(islice(entries, limit))
+            segments = list(self.segments)
+        return self._read_segments(from_seq, limit, segments, channels)
+
+    def _read_segments(self, from_seq, limit, segments, channels=None):
+        out = []
+        for segment in segments:
+            if segment.last_seq < from_seq:
+                continue
+            try:
+                out.extend(segment.read(from_seq, limit - len(out), channels))
+            except (FileNotFoundError, ValueError):
+                continue  # removed by retention while we were reading
+            if len(out) >= limit:
+                break
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Multi-Process (pre-fork) Mode for the Multi-Service Server
+N worker processes each bind the chat, info and file ports with
+SO_REUSEPORT, so the kernel spreads connections and datagrams across cores.
+
+Chat clients on different workers still need to see each other, so every
+broadcast goes through a small relay in the parent process over a Unix
+socket. The relay is also the sequencer: it numbers stored messages and
+sends each one back to every worker (the origin included), so all workers
+keep identical history with identical sequence numbers.
+
+    worker --PUBLISH(store, exclude_id, channel, text)--> relay
+    relay  --DELIVER(seq, origin, exclude_id, channel, text)--> all workers
+
+Per-worker state (USERS, STATUS counts, METRICS) describes that worker only.
+"""
+import multiprocessing
+import os
+import selectors
+import socket
+import tempfile
+import threading
+
+from framing import CHAT_MAX_PAYLOAD, FrameDecoder, encode_frame, recv_frame
+
+# Bus frame types (internal, never seen by chat clients)
+HELLO = 100     # worker -> relay: worker_id NUL last_seq
+PUBLISH = 101
+DELIVER = 102
+# A relayed chat line plus its name, channel and sequence metadata
+BUS_MAX_PAYLOAD = 4 * CHAT_MAX_PAYLOAD
+
+
+class BusRelay:
+    """Fans out every published message to all connected workers"""
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self.workers = {}       # socket -> worker id
+        self.decoders = {}
+        self.selector = selectors.DefaultSelector()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen(64)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+
+    def serve_forever(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.listener:
+                    conn, _ = self.listener.accept()
+                    self.workers[conn] = None
+                    self.decoders[conn] = FrameDecoder(BUS_MAX_PAYLOAD)
+                    self.selector.register(conn, selectors.EVENT_READ)
+                else:
+                    self.read_worker(key.fileobj)
+
+    def read_worker(self, conn):
+        decoder = self.decoders[conn]
+        try:
+            if decoder.recv_from(conn) == 0:
+                raise ConnectionError("worker closed the bus")
+            for kind, payload in decoder.frames():
+                self.handle(conn, kind, payload)
+        except OSError:
+            print(f"⚠️  Bus: worker {self.workers.get(conn)} disconnected")
+            self.selector.unregister(conn)
+            self.workers.pop(conn, None)
+            self.decoders.pop(conn, None)
+            conn.close()
+
+    def handle(self, conn, kind, payload):
+        if kind == HELLO:
+            worker_id, _, last_seq = payload.decode().partition("\0")
+            self.workers[conn] = worker_id
+            # Continue numbering after whatever history workers reloaded
+            self.seq = max(self.seq, int(last_seq or 0))
+        elif kind == PUBLISH:
+            store, exclude_id, rest = payload.split(b"\0", 2)
+            seq = 0
+            if store == b"1":
+                self.seq += 1
+                seq = self.seq
+            origin = self.workers[conn]
+            frame = encode_frame(DELIVER, f"{seq}\0{origin}\0".encode() + exclude_id + b"\0" + rest)
+            for worker in list(self.workers):
+                try:
+                    worker.sendall(frame)
+                except OSError:
+                    pass  # cleaned up when its read side fails
+
+
+class BusClient:
+    """A worker's connection to the relay"""
+
+    def __init__(self, path, worker_id, on_deliver):
+        self.worker_id = str(worker_id)
+        self.on_deliver = on_deliver
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.send_lock = threading.Lock()   # many handler threads publish
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+
+    def start(self, last_seq=0):
+        self.send(encode_frame(HELLO, f"{self.worker_id}\0{last_seq}"))
+        self.reader.start()
+
+    def send(self, frame):
+        with self.send_lock:
+            self.sock.sendall(frame)
+
+    def publish(self, message, channel, exclude_id=0, store=False):
+        payload = f"{int(store)}\0{exclude_id}\0{channel}\0{message}"
+        self.send(encode_frame(PUBLISH, payload))
+
+    def read_loop(self):
+        decoder = FrameDecoder(BUS_MAX_PAYLOAD)
+        while True:
+            try:
+                frame = recv_frame(self.sock, decoder)
+            except OSError:
+                frame = None
+            if frame is None:
+                # Without the bus this worker would silently split the chat
+                print(f"❌ Worker {self.worker_id}: lost the message bus, exiting")
+                os._exit(1)
+            kind, payload = frame
+            if kind == DELIVER:
+                seq, origin, exclude_id, channel, message = payload.decode(errors="replace").split("\0", 4)
+                self.on_deliver(int(seq), origin, int(exclude_id), channel, message)
+
+
+def run_worker(worker_id, bus_path, engine, server_kwargs, history_kwargs):
+    """Entry point of one worker process"""
+    from enhanced_server import MultiServiceServer
+    from chat_history import ChatHistory
+
+    history_kwargs = dict(history_kwargs)
+    if history_kwargs.get("log_dir"):
+        history_kwargs["log_dir"] = os.path.join(history_kwargs["log_dir"], f"worker-{worker_id}")
+    history = ChatHistory(**history_kwargs)
+    server_kwargs = dict(server_kwargs)
+    if server_kwargs.get("metrics_port"):
+        # Each worker has its own metrics; scrape them on consecutive ports
+        server_kwargs["metrics_port"] += worker_id - 1
+    server = MultiServiceServer(history=history, reuse_port=True, **server_kwargs)
+    server.bus = BusClient(bus_path, worker_id, server.bus_delivery)
+    server.bus.start(len(history))
+    print(f"🧩 Worker {worker_id} (pid {os.getpid()}) starting")
+    server.start(engine=engine)
+
+
+def run_cluster(workers, engine, server_kwargs, history_kwargs):
+    """Start the relay and `workers` worker processes; blocks until Ctrl+C"""
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("Multi-process mode needs SO_REUSEPORT and Unix sockets")
+
+    bus_dir = tempfile.mkdtemp(prefix="chatbus-")
+    bus_path = os.path.join(bus_dir, "bus.sock")
+    relay = BusRelay(bus_path)
+    threading.Thread(target=relay.serve_forever, daemon=True).start()
+    print(f"🚌 Message bus relay on {bus_path}")
+
+    procs = []
+    for worker_id in range(1, workers + 1):
+        proc = multiprocessing.Process(target=run_worker, name=f"worker-{worker_id}",
+                                       args=(worker_id, bus_path, engine, server_kwargs, history_kwargs))
+        proc.start()
+        procs.append(proc)
+
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down workers...")
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
+    finally:
+        try:
+            os.remove(bus_path)
+            os.rmdir(bus_dir)
+        except OSError:
+            pass
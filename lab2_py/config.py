@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+Service Ports
+Well-known ports of the multi-service server, shared by the server, its
+asyncio engine and the load generator without importing the server script.
+"""
+
+CHAT_PORT = 9001
+INFO_PORT = 9002
+FILE_PORT = 9003
+METRICS_PORT = 9004
@@ -3,13 +3,32 @@
 Enhanced Multi-Client for Multi-Service Server
 Demonstrates different socket protocols and client types
 """
+import io
+import json
+import mmap
+import os
 import socket
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import framing
+from channels import valid_channel
+from framing import FrameDecoder, parse_chat_payload, recv_frame, send_frame
+from file_transfer import (download_header, file_size, parse_file_header, recv_file_body,
+                           send_file_body, split_ranges, upload_header)
+from info_snapshot import unpack_reply
+
+PREVIEW_BYTES = 4096
 
 class MultiServiceClient:
     def __init__(self):
         self.chat_running = False
+        self.last_seq = 0   # newest chat sequence number seen, for catch-up
+        self.channel_seq = {}         # channel -> newest sequence number seen there
+        self.channel = "general"      # where typed messages go
+        self.joined = {"general"}     # channels the server confirmed
+        self.joining = set()          # /join sent, waiting for the server's OK
     
     def tcp_chat_client(self, host='localhost', port=9001):
         """Connect to TCP chat service"""
@@ -17,27 +36,65 @@ class MultiServiceClient:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.connect((host, port))
             
+            decoder = FrameDecoder()
+            
             # Get username prompt
-            response = sock.recv(1024).decode()
-            if response.startswith("USERNAME:"):
+            frame = recv_frame(sock, decoder)
+            if frame and frame[0] == framing.USERNAME:
                 username = input("Enter username: ")
-                sock.send(username.encode())
+                send_frame(sock, framing.USERNAME, username)
+            
+            # Reconnecting: rejoin our channels and ask for everything we missed
+            for channel in self.joined - {"general"}:
+                send_frame(sock, framing.JOIN, channel)
+            if self.last_seq:
+                send_frame(sock, framing.SINCE, str(self.last_seq))
             
             self.chat_running = True
             
             # Start receiving messages
-            receive_thread = threading.Thread(target=self.receive_chat_messages, args=(sock,))
+            receive_thread = threading.Thread(target=self.receive_chat_messages, args=(sock, decoder))
             receive_thread.daemon = True
             receive_thread.start()
             
             print(f"💬 Connected to chat! Type messages (or 'quit' to exit)")
+            print("   '/join NAME' joins (and switches to) a channel, '/leave NAME' leaves it")
+            print("   '/since N' replays every message after sequence number N")
             
             # Send messages
             while self.chat_running:
                 message = input()
                 if message.lower() == 'quit':
                     break
-                sock.send(message.encode())
+                if message.startswith("/since "):
+                    try:
+                        since = int(message.split(maxsplit=1)[1])
+                    except ValueError:
+                        print("Usage: /since N (a message sequence number)")
+                        continue
+                    # Let the replay through even for messages already shown
+                    self.last_seq = min(self.last_seq, since)
+                    for channel, seq in self.channel_seq.items():
+                        self.channel_seq[channel] = min(seq, since)
+                    send_frame(sock, framing.SINCE, str(since))
+                    continue
+                if message.startswith("/join "):
+                    # Switch only once the server confirms (receive_chat_messages)
+                    channel = message.split(maxsplit=1)[1].strip()
+                    if not valid_channel(channel):
+                        print("❌ Invalid channel name")
+                        continue
+                    self.joining.add(channel)
+                    send_frame(sock, framing.JOIN, channel)
+                    continue
+                if message.startswith("/leave "):
+                    channel = message.split(maxsplit=1)[1].strip()
+                    self.joined.discard(channel)
+                    send_frame(sock, framing.LEAVE, channel)
+                    if channel == self.channel:
+                        self.channel = "general"
+                    continue
+                send_frame(sock, framing.TEXT, f"{self.channel}\0{message}")
             
         except Exception as e:
             print(f"❌ Chat error: {e}")
@@ -45,63 +102,193 @@ class MultiServiceClient:
             sock.close()
             self.chat_running = False
     
-    def receive_chat_messages(self, sock):
+    def receive_chat_messages(self, sock, decoder):
         """Receive chat messages in background"""
         while self.chat_running:
             try:
-                data = sock.recv(1024).decode()
-                if data.startswith("MSG:"):
-                    print(f"\r{data[4:]}")
-                elif data.startswith("HISTORY:"):
-                    print(f"📜 {data[8:]}")
+                frame = recv_frame(sock, decoder)
+                if frame is None:
+                    break
+                kind, payload = frame
+                if kind == framing.MSG:
+                    seq, channel, text = parse_chat_payload(payload)
+                    self.seen(seq, channel)
+                    print(f"\r#{channel} {text}" if channel else f"\r{text}")
+                elif kind == framing.HISTORY:
+                    seq, channel, text = parse_chat_payload(payload)
+                    if seq <= self.channel_seq.get(channel, 0):
+                        continue  # already shown (join replay overlaps catch-up)
+                    self.seen(seq, channel)
+                    print(f"📜 [{seq}] #{channel} {text}")
+                elif kind == framing.OK:
+                    channel = payload.decode()
+                    self.joined.add(channel)
+                    if channel in self.joining:
+                        self.joining.discard(channel)
+                        self.channel = channel
+                        print(f"\r➡️  Now talking in #{channel}")
+                elif kind == framing.ERROR:
+                    print(f"\r❌ {payload.decode()}")
                 print("> ", end="", flush=True)
             except:
                 break
     
+    def seen(self, seq, channel):
+        """Remember the newest sequence number overall and per channel"""
+        self.last_seq = max(self.last_seq, seq)
+        if channel:
+            self.channel_seq[channel] = max(self.channel_seq.get(channel, 0), seq)
+    
     def udp_info_client(self, host='localhost', port=9002, command="STATUS"):
         """Send UDP info request"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.sendto(command.encode(), (host, port))
-            
-            response, addr = sock.recvfrom(1024)
-            print(f"📊 Server Info: {response.decode()}")
-            sock.close()
+            response = self.udp_request(host, port, command)
+            name, _, fmt = command.strip().partition(" ")
+            if fmt.strip().lower() == "bin":
+                print(f"📊 Server Info ({len(response)} bytes): {unpack_reply(name, response)}")
+            else:
+                print(f"📊 Server Info: {json.loads(response)}")
             
         except Exception as e:
             print(f"❌ UDP error: {e}")
     
-    def tcp_file_client(self, host='localhost', port=9003, action="upload", filename="test.txt"):
-        """Upload or download files"""
+    def udp_request(self, host='localhost', port=9002, command="STATUS", timeout=None):
+        """Send one UDP info command and return the raw reply"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            sock.sendto(command.encode(), (host, port))
+            response, addr = sock.recvfrom(65535)
+        return response
+    
+    def tcp_file_client(self, host='localhost', port=9003, action="upload", filename="test.txt",
+                        resume=False, connections=1):
+        """Upload or download files (optionally resuming, or in parallel ranges)"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((host, port))
+            if action == "download" and connections > 1:
+                self.parallel_download(host, port, filename, connections)
+                return
             
             if action == "upload":
-                # Create test content
-                content = f"Test file created at {time.ctime()}\nSocket programming demo!"
-                message = f"UPLOAD:{filename}:{content}"
-                sock.send(message.encode())
-                
-                response = sock.recv(1024).decode()
-                print(f"📤 Upload result: {response}")
+                if os.path.isfile(filename):
+                    f = open(filename, "rb")
+                else:
+                    # Create test content
+                    content = f"Test file created at {time.ctime()}\nSocket programming demo!"
+                    f = io.BytesIO(content.encode())
+                with f:
+                    ok, message = self.upload(host, port, f, filename, resume)
+                print(f"📤 Upload result: {message}")
                 
             elif action == "download":
-                message = f"DOWNLOAD:{filename}"
-                sock.send(message.encode())
-                
-                response = sock.recv(4096).decode()
-                if response.startswith("FILE:"):
-                    content = response[5:]
-                    print(f"📥 Downloaded content:\n{content}")
+                local_name = f"downloaded_{os.path.basename(filename)}"
+                offset = os.path.getsize(local_name) if resume and os.path.isfile(local_name) else 0
+                with open(local_name, "r+b" if offset else "wb") as f:
+                    ok, result = self.download(host, port, filename, f, offset)
+                if ok:
+                    count, total = result
+                    print(f"📥 Downloaded {count} bytes to {local_name} ({total} bytes total)")
+                    if total <= PREVIEW_BYTES:
+                        with open(local_name, "rb") as f:
+                            print(f.read().decode(errors="replace"))
                 else:
-                    print(f"📥 Download result: {response}")
-            
-            sock.close()
+                    if not offset:
+                        os.remove(local_name)
+                    print(f"📥 Download result: {result}")
             
         except Exception as e:
             print(f"❌ File error: {e}")
     
+    def upload(self, host, port, f, filename, resume=False):
+        """Stream the open binary file `f` to the server; returns (ok, message)"""
+        size = file_size(f)
+        offset = min(self.remote_file_size(host, port, filename) or 0, size) if resume else 0
+        with socket.create_connection((host, port)) as sock:
+            send_frame(sock, framing.UPLOAD, upload_header(filename, size - offset, offset))
+            send_file_body(sock, f, offset, size - offset)
+            frame = recv_frame(sock, FrameDecoder())
+        if frame is None:
+            return False, "connection closed"
+        return frame[0] == framing.OK, frame[1].decode()
+    
+    def download(self, host, port, filename, f, offset=0):
+        """Stream a remote file into the open binary file `f` at `offset`.
+
+        Returns (True, (count, total)) or (False, error message).
+        """
+        decoder = FrameDecoder()
+        with socket.create_connection((host, port)) as sock:
+            send_frame(sock, framing.DOWNLOAD, download_header(filename, offset))
+            frame = recv_frame(sock, decoder)
+            if frame is None:
+                return False, "connection closed"
+            kind, payload = frame
+            if kind != framing.FILE:
+                return False, payload.decode()
+            count, total = parse_file_header(payload)
+            f.seek(offset)
+            recv_file_body(sock, decoder, f, count)
+            f.truncate()
+        return True, (count, total)
+    
+    def remote_file_size(self, host, port, filename):
+        """Ask the file service for a file's size (None if it does not exist)"""
+        with socket.create_connection((host, port)) as sock:
+            send_frame(sock, framing.DOWNLOAD, download_header(filename, 0, 0))
+            frame = recv_frame(sock, FrameDecoder())
+        if frame is None or frame[0] != framing.FILE:
+            return None
+        return parse_file_header(frame[1])[1]
+    
+    def parallel_download(self, host, port, filename, connections=4, retries=3):
+        """Fetch a file as N byte ranges over N connections into a mapped file"""
+        total = self.remote_file_size(host, port, filename)
+        if total is None:
+            print("📥 Download result: File not found")
+            return
+        
+        local_name = f"downloaded_{os.path.basename(filename)}"
+        ranges = split_ranges(total, connections)
+        start = time.time()
+        with open(local_name, "w+b") as f:
+            f.truncate(total)
+            if total:
+                with mmap.mmap(f.fileno(), total) as mm, memoryview(mm) as view:
+                    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                        jobs = [pool.submit(self.fetch_range, host, port, filename, view, offset, length, retries)
+                                for offset, length in ranges]
+                        for job in jobs:
+                            job.result()
+                    mm.flush()
+        elapsed = max(time.time() - start, 1e-6)
+        print(f"📥 Downloaded {total} bytes to {local_name} over {len(ranges)} connections "
+              f"({total / elapsed / 1e6:.1f} MB/s)")
+    
+    def fetch_range(self, host, port, filename, view, offset, length, retries=3):
+        """Receive one byte range straight into `view`, resuming after drops"""
+        done = 0
+        for attempt in range(retries + 1):
+            try:
+                with socket.create_connection((host, port)) as sock:
+                    decoder = FrameDecoder()
+                    send_frame(sock, framing.DOWNLOAD, download_header(filename, offset + done, length - done))
+                    frame = recv_frame(sock, decoder)
+                    if frame is None or frame[0] != framing.FILE:
+                        raise ConnectionError(frame[1].decode() if frame else "connection closed")
+                    with view[offset + done:offset + length] as part:
+                        filled = decoder.drain_into(part)
+                        done += filled
+                        while done < length:
+                            n = sock.recv_into(part[filled:])
+                            if n == 0:
+                                raise ConnectionError("connection closed mid-range")
+                            filled += n
+                            done += n
+                return done
+            except OSError:
+                if attempt == retries:
+                    raise
+                time.sleep(0.5 * (attempt + 1))
+    
     def demo_all_services(self):
         """Demonstrate all services"""
         print("🎮 Multi-Service Client Demo")
@@ -136,14 +323,15 @@ def main():
     print("3. File Upload")
     print("4. File Download") 
     print("5. Demo All Services")
+    print("6. Parallel Download")
     
     try:
-        choice = input("\nEnter choice (1-5): ")
+        choice = input("\nEnter choice (1-6): ")
         
         if choice == "1":
             client.tcp_chat_client()
         elif choice == "2":
-            cmd = input("Enter command (STATUS/TIME/USERS): ") or "STATUS"
+            cmd = input("Enter command (STATUS/TIME/USERS/CHANNELS/METRICS, add ' bin' for binary): ") or "STATUS"
             client.udp_info_client(command=cmd)
         elif choice == "3":
             filename = input("Enter filename: ") or "test.txt"
@@ -153,6 +341,10 @@ def main():
             client.tcp_file_client(action="download", filename=filename)
         elif choice == "5":
             client.demo_all_services()
+        elif choice == "6":
+            filename = input("Enter filename: ") or "test.txt"
+            connections = int(input("Connections (default 4): ") or 4)
+            client.tcp_file_client(action="download", filename=filename, connections=connections)
         else:
             print("Invalid choice")
             
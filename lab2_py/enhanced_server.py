@@ -2,25 +2,138 @@
 """
 Enhanced Multi-Service Socket Server
 Demonstrates: TCP/UDP sockets, threading, multiple services, protocol handling
+Chat and file traffic use the length-prefixed frames defined in framing.py
 """
+import os
 import socket
 import threading
 import time
 import json
-from datetime import datetime
+import argparse
+
+import framing
+from framing import HEADER, FrameDecoder, chat_payload, encode_frame, recv_frame, send_frame
+from chat_history import ChatHistory, CATCHUP_LIMIT
+from broadcast import COALESCE, OUTBOX_LIMIT, POLICIES, Outbox, next_conn_id
+from channels import DEFAULT_CHANNEL, ChannelRegistry, valid_channel
+from file_transfer import (file_header, file_size, parse_download_header,
+                           parse_upload_header, recv_file_body, send_file_body)
+from udp_batch import BATCH, RCVBUF, BatchedUDP, PacketStats
+from info_snapshot import InfoSnapshot, pack_channels, pack_status, pack_time, pack_users
+from metrics import METRICS, serve_prometheus
+from config import CHAT_PORT, FILE_PORT, INFO_PORT, METRICS_PORT
+
+INFO_TICK = 0.25   # seconds a STATUS/TIME reply may be reused
+MAX_SEQ_DIGITS = 20  # a SINCE sequence number fits in 64 bits
+
+class ChatConnection:
+    """Chat socket with its own outbox, drained by a dedicated writer thread"""
+    
+    def __init__(self, sock, outbox_limit=OUTBOX_LIMIT, policy=COALESCE):
+        self.sock = sock
+        self.conn_id = next_conn_id()
+        self.channels = set()   # channels joined (touched only by the reader thread)
+        self.outbox = Outbox(outbox_limit, policy)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+    
+    def send(self, frame):
+        """Queue a direct reply (never dropped)"""
+        self.outbox.put(frame, force=True)
+    
+    def deliver(self, frame):
+        """Queue a broadcast; False means the slow-consumer policy says disconnect"""
+        return self.outbox.put(frame)
+    
+    def write_loop(self):
+        while True:
+            batch = self.outbox.take()
+            if not batch:
+                break
+            try:
+                # Everything queued goes out in one syscall
+                data = b"".join(batch)
+                self.sock.sendall(data)
+                METRICS.inc("chat_bytes_out", len(data))
+            except OSError:
+                break
+        self.close()
+    
+    def close(self):
+        """Stop the writer and wake the reader so the handler cleans up"""
+        self.outbox.close()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
 class MultiServiceServer:
-    def __init__(self):
+    def __init__(self, host='localhost', history=None, outbox_limit=OUTBOX_LIMIT, slow_policy=COALESCE,
+                 reuse_port=False, udp_receivers=1, udp_batch=BATCH, metrics_port=METRICS_PORT):
+        self.host = host
+        self.reuse_port = reuse_port   # pre-fork workers share the ports
+        self.udp_receivers = udp_receivers
+        self.udp_batch = udp_batch
+        self.info_stats = []           # one PacketStats per UDP receiver
+        self.metrics_port = metrics_port
+        self.bus = None                # cluster.BusClient in multi-process mode
         self.running = True
         self.clients = {}
-        self.message_history = []
+        self.clients_lock = threading.Lock()
+        self.channels = ChannelRegistry()
+        self.history = history if history is not None else ChatHistory()
+        self.outbox_limit = outbox_limit
+        self.slow_policy = slow_policy
+        self.started = time.time()
+        self.info = InfoSnapshot()
+        self.info.register("STATUS", self.status_info, pack_status, ttl=INFO_TICK)
+        self.info.register("TIME", self.time_info, pack_time, ttl=INFO_TICK)
+        self.info.register("USERS", self.users_info, pack_users)
+        self.info.register("CHANNELS", self.channels.counts, pack_channels)
+        self.info.register("METRICS", METRICS.snapshot, None, ttl=INFO_TICK)
+        self.register_metrics()
+    
+    def register_metrics(self):
+        """Scrape-time gauges and help text for the metrics endpoints"""
+        METRICS.gauge("chat_clients", lambda: len(self.clients), "Connected chat clients")
+        METRICS.gauge("threads_active", threading.active_count, "Live threads (threads engine: ~2 per chat client)")
+        METRICS.gauge("history_messages", lambda: len(self.history), "Chat messages recorded", "counter")
+        METRICS.gauge("info_packets", lambda: sum(s.packets for s in self.info_stats),
+                      "UDP info requests answered", "counter")
+        METRICS.gauge("info_errors", lambda: sum(s.errors for s in self.info_stats),
+                      "UDP info receive/send errors", "counter")
+        for name, text in [("chat_connections", "Chat connections accepted"),
+                           ("chat_bytes_in", "Chat frame bytes received"),
+                           ("chat_bytes_out", "Chat bytes written to sockets"),
+                           ("chat_messages", "Chat lines published"),
+                           ("chat_deliveries", "Broadcast frames queued on outboxes"),
+                           ("file_bytes_in", "Upload body bytes received"),
+                           ("file_bytes_out", "Download body bytes sent"),
+                           ("broadcast_fanout_seconds", "Time to queue one broadcast on every subscriber"),
+                           ("file_upload_seconds", "Upload duration (body only)"),
+                           ("file_download_seconds", "Download duration (body only)")]:
+            METRICS.describe(name, text)
         
-    def tcp_chat_server(self, port=9001):
-        """TCP Chat Service - Multiple clients can chat"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def bind_socket(self, kind, port, backlog=128, reuse_port=False):
+        """Create a bound (and, for TCP, listening) socket for one service"""
+        sock = socket.socket(socket.AF_INET, kind)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(('localhost', port))
-        sock.listen(5)
+        if kind == socket.SOCK_DGRAM:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+            except OSError:
+                pass
+        if self.reuse_port or reuse_port:
+            # Every worker binds the same port; the kernel spreads the load
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.host, port))
+        if kind == socket.SOCK_STREAM:
+            sock.listen(backlog)
+        return sock
+    
+    def tcp_chat_server(self, port=CHAT_PORT):
+        """TCP Chat Service - Multiple clients can chat"""
+        sock = self.bind_socket(socket.SOCK_STREAM, port)
         print(f"📱 TCP Chat Server running on port {port}")
         
         while self.running:
@@ -33,94 +146,198 @@ class MultiServiceServer:
                 break
         sock.close()
     
-    def handle_chat_client(self, client, addr):
-        """Handle individual chat client"""
+    def handle_chat_client(self, sock, addr):
+        """Handle individual chat client (this thread reads, a writer thread sends)"""
         username = None
+        client = ChatConnection(sock, self.outbox_limit, self.slow_policy)
+        METRICS.inc("chat_connections")
         try:
-            # Get username
-            client.send("USERNAME:".encode())
-            username = client.recv(1024).decode().strip()
-            self.clients[client] = username
-            
-            # Send recent messages
-            for msg in self.message_history[-5:]:
-                client.send(f"HISTORY:{msg}".encode())
+            decoder = FrameDecoder(framing.CHAT_MAX_PAYLOAD)
             
-            # Broadcast join
-            join_msg = f"{username} joined the chat"
-            self.broadcast_message(join_msg, exclude=client)
-            print(f"👤 {username} connected from {addr}")
+            # Get username
+            client.send(encode_frame(framing.USERNAME))
+            frame = recv_frame(sock, decoder)
+            if frame is None:
+                return
+            username = frame[1].decode().strip()
+            self.join_chat(client, username, addr)
             
             # Handle messages
             while self.running:
-                data = client.recv(1024).decode().strip()
-                if not data:
+                frame = recv_frame(sock, decoder)
+                if frame is None:
                     break
-                    
-                message = f"[{username}] {data}"
-                self.message_history.append(message)
-                self.broadcast_message(message, exclude=client)
-                print(f"💬 {message}")
+                self.handle_chat_frame(client, username, *frame)
                 
         except:
             pass
         finally:
-            if client in self.clients:
-                del self.clients[client]
-                if username:
-                    leave_msg = f"{username} left the chat"
-                    self.broadcast_message(leave_msg)
-                    print(f"👋 {username} disconnected")
+            self.leave_chat(client, username)
             client.close()
+            sock.close()
+    
+    def handle_chat_frame(self, client, username, kind, payload):
+        """Dispatch one frame received from a chat client"""
+        METRICS.inc("chat_bytes_in", HEADER.size + len(payload))
+        if kind == framing.TEXT:
+            channel, sep, data = payload.decode(errors="replace").partition("\0")
+            if not sep:
+                channel, data = DEFAULT_CHANNEL, channel
+            data = data.strip()
+            if not data:
+                return
+            if channel in client.channels:
+                self.chat_message(client, username, channel, data)
+            else:
+                client.send(encode_frame(framing.ERROR, f"Not in #{channel} - /join it first"))
+        elif kind == framing.JOIN:
+            self.join_channel(client, username, payload.decode(errors="replace").strip())
+        elif kind == framing.LEAVE:
+            self.leave_channel(client, username, payload.decode(errors="replace").strip())
+        elif kind == framing.SINCE:
+            # Catch-up after reconnect: replay everything after the client's last seq
+            text = payload.decode(errors="replace").strip() or "0"
+            # isdigit() alone lets through "²" and numbers too long for int()
+            if not (text.isascii() and text.isdigit() and len(text) <= MAX_SEQ_DIGITS):
+                client.send(encode_frame(framing.ERROR, "SINCE needs a message sequence number"))
+                return
+            last_seen = int(text)
+            for seq, channel, msg in self.history.since(last_seen, CATCHUP_LIMIT, set(client.channels)):
+                client.send(encode_frame(framing.HISTORY, chat_payload(seq, channel, msg)))
+    
+    def join_chat(self, client, username, addr):
+        """Register a chat client and put it in the default channel"""
+        with self.clients_lock:
+            self.clients[client] = username
+        self.info.invalidate("USERS")
+        self.join_channel(client, username, DEFAULT_CHANNEL)
+        print(f"👤 {username} connected from {addr}")
     
-    def broadcast_message(self, message, exclude=None):
-        """Send message to all connected clients"""
-        for client in list(self.clients.keys()):
-            if client != exclude:
-                try:
-                    client.send(f"MSG:{message}".encode())
-                except:
-                    if client in self.clients:
-                        del self.clients[client]
-    
-    def udp_info_server(self, port=9002):
-        """UDP Info Service - Returns server stats"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.bind(('localhost', port))
-        print(f"📊 UDP Info Server running on port {port}")
+    def join_channel(self, client, username, channel):
+        """Subscribe a client, replay the channel's recent history and announce it.
+
+        The client gets an OK frame with the channel name once it is a member
+        (also if it already was), an ERROR frame if the name is rejected.
+        """
+        if not valid_channel(channel):
+            client.send(encode_frame(framing.ERROR, "Invalid channel name"))
+            return
+        if not self.channels.join(channel, client, username):
+            client.send(encode_frame(framing.OK, channel))
+            return
+        client.send(encode_frame(framing.OK, channel))
+        client.channels.add(channel)
+        self.info.invalidate("CHANNELS")
         
-        while self.running:
-            try:
-                data, addr = sock.recvfrom(1024)
-                request = data.decode().strip()
-                
-                if request == "STATUS":
-                    response = {
-                        "active_clients": len(self.clients),
-                        "messages_sent": len(self.message_history),
-                        "server_time": datetime.now().isoformat(),
-                        "uptime": "Running"
-                    }
-                elif request == "TIME":
-                    response = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                elif request == "USERS":
-                    response = list(self.clients.values())
-                else:
-                    response = "Available commands: STATUS, TIME, USERS"
-                
-                sock.sendto(str(response).encode(), addr)
-                print(f"📡 UDP request from {addr}: {request}")
-                
-            except:
-                break
+        # Send recent messages
+        for seq, _, msg in self.history.recent(5, {channel}):
+            client.send(encode_frame(framing.HISTORY, chat_payload(seq, channel, msg)))
+        
+        # Broadcast join
+        self.publish(f"{username} joined #{channel}", channel, exclude=client)
+    
+    def leave_channel(self, client, username, channel):
+        """Unsubscribe a client from one channel and announce it"""
+        if self.channels.leave(channel, client):
+            client.channels.discard(channel)
+            self.info.invalidate("CHANNELS")
+            self.publish(f"{username} left #{channel}", channel)
+    
+    def chat_message(self, client, username, channel, data):
+        """Record a chat line and relay it to the rest of the channel"""
+        message = f"[{username}] {data}"
+        METRICS.inc("chat_messages")
+        self.publish(message, channel, exclude=client, store=True)
+        print(f"💬 #{channel} {message}")
+    
+    def leave_chat(self, client, username):
+        """Unregister a chat client and announce the departure in its channels"""
+        with self.clients_lock:
+            removed = self.clients.pop(client, None) is not None
+        if removed:
+            self.info.invalidate("USERS")
+            for channel in list(client.channels):
+                self.leave_channel(client, username, channel)
+            print(f"👋 {username} disconnected")
+    
+    def publish(self, message, channel, exclude=None, store=False):
+        """Record (if store) and broadcast a line; via the bus in cluster mode"""
+        exclude_id = exclude.conn_id if exclude is not None else 0
+        if self.bus is not None:
+            # The relay numbers the message and sends it back to every worker
+            self.bus.publish(message, channel, exclude_id, store)
+            return
+        seq = self.history.append(message, channel) if store else 0
+        self.broadcast_message(message, channel, exclude_id, seq)
+    
+    def bus_delivery(self, seq, origin, exclude_id, channel, message):
+        """A line relayed from any worker (including this one)"""
+        if seq:
+            self.history.append(message, channel, seq=seq)
+        if origin != self.bus.worker_id:
+            exclude_id = 0
+        self.broadcast_message(message, channel, exclude_id, seq)
+    
+    def broadcast_message(self, message, channel=DEFAULT_CHANNEL, exclude_id=0, seq=0):
+        """Queue message for every local subscriber of channel (encoded once, never blocks)"""
+        start = time.perf_counter()
+        frame = encode_frame(framing.MSG, chat_payload(seq, channel, message))
+        delivered = 0
+        for client in self.channels.members(channel):
+            if client.conn_id == exclude_id or client.outbox.closed:
+                continue
+            if not client.deliver(frame):
+                # Slow consumer under the disconnect policy; its handler
+                # notices the closed socket and runs leave_chat()
+                print(f"🐢 Disconnecting slow consumer {self.clients.get(client)}")
+                client.close()
+            else:
+                delivered += 1
+        METRICS.inc("chat_deliveries", delivered)
+        METRICS.observe("broadcast_fanout_seconds", time.perf_counter() - start)
+    
+    def udp_info_server(self, port=INFO_PORT, receiver=1):
+        """UDP Info Service - Returns server stats, a batch of datagrams per wakeup"""
+        sock = self.bind_socket(socket.SOCK_DGRAM, port, reuse_port=self.udp_receivers > 1)
+        print(f"📊 UDP Info Server running on port {port}" +
+              (f" (receiver {receiver}/{self.udp_receivers})" if self.udp_receivers > 1 else ""))
+        
+        stats = PacketStats("UDP info" if self.udp_receivers == 1 else f"UDP info #{receiver}")
+        self.info_stats.append(stats)
+        batcher = BatchedUDP(sock, self.info_datagram, stats, self.udp_batch)
+        try:
+            batcher.serve_forever(lambda: self.running)
+        except:
+            pass
         sock.close()
     
-    def tcp_file_server(self, port=9003):
-        """TCP File Service - Simple file upload/download"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(('localhost', port))
-        sock.listen(5)
+    def info_datagram(self, data, addr):
+        """BatchedUDP handler for the info service"""
+        return self.info.reply(bytes(data))
+    
+    def info_response(self, request):
+        """Encoded reply for a UDP info command (pre-built, see info_snapshot.py)"""
+        return self.info.reply(request.encode())
+    
+    def status_info(self):
+        return {
+            "active_clients": len(self.clients),
+            "messages_sent": len(self.history),
+            "server_time": time.time(),
+            "uptime": round(time.time() - self.started, 3)
+        }
+    
+    def time_info(self):
+        now = time.time()
+        return {"server_time": now, "local": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))}
+    
+    def users_info(self):
+        with self.clients_lock:
+            return list(self.clients.values())
+    
+    def tcp_file_server(self, port=FILE_PORT):
+        """TCP File Service - Streaming file upload/download"""
+        sock = self.bind_socket(socket.SOCK_STREAM, port)
         print(f"📁 TCP File Server running on port {port}")
         
         while self.running:
@@ -136,58 +353,101 @@ class MultiServiceServer:
     def handle_file_client(self, client, addr):
         """Handle file upload/download requests"""
         try:
-            # Simple protocol: UPLOAD:filename:content or DOWNLOAD:filename
-            data = client.recv(4096).decode()
-            
-            if data.startswith("UPLOAD:"):
-                parts = data.split(":", 2)
-                if len(parts) == 3:
-                    filename = parts[1]
-                    content = parts[2]
-                    with open(f"server_{filename}", "w") as f:
-                        f.write(content)
-                    client.send(f"File {filename} uploaded successfully".encode())
-                    print(f"📤 File uploaded: {filename} from {addr}")
-                
-            elif data.startswith("DOWNLOAD:"):
-                filename = data.split(":", 1)[1]
-                try:
-                    with open(f"server_{filename}", "r") as f:
-                        content = f.read()
-                    client.send(f"FILE:{content}".encode())
-                    print(f"📥 File downloaded: {filename} to {addr}")
-                except FileNotFoundError:
-                    client.send("ERROR:File not found".encode())
+            decoder = FrameDecoder(framing.FILE_MAX_PAYLOAD)
+            frame = recv_frame(client, decoder)
+            if frame is not None:
+                self.handle_file_request(client, decoder, *frame, addr)
         except:
             pass
         finally:
             client.close()
     
-    def start(self):
+    def handle_file_request(self, client, decoder, kind, payload, addr):
+        """Stream one upload or download on a blocking socket"""
+        if kind == framing.UPLOAD:
+            try:
+                filename, size, offset = parse_upload_header(payload)
+            except ValueError as e:
+                send_frame(client, framing.ERROR, str(e))
+                return
+            path = f"server_{filename}"
+            if offset:
+                # Resume: keep the bytes we already have, append from offset
+                current = os.path.getsize(path) if os.path.isfile(path) else 0
+                if offset > current:
+                    send_frame(client, framing.ERROR, f"Resume offset beyond stored size ({current} bytes)")
+                    return
+                f = open(path, "r+b")
+                f.seek(offset)
+            else:
+                f = open(path, "wb")
+            with f, METRICS.timer("file_upload_seconds"):
+                recv_file_body(client, decoder, f, size)
+                f.truncate()
+            METRICS.inc("file_bytes_in", size)
+            send_frame(client, framing.OK, f"File {filename} uploaded successfully ({offset + size} bytes)")
+            print(f"📤 File uploaded: {filename} ({size} bytes at offset {offset}) from {addr}")
+            
+        elif kind == framing.DOWNLOAD:
+            try:
+                filename, offset, length = parse_download_header(payload)
+                f = open(f"server_{filename}", "rb")
+            except ValueError as e:
+                send_frame(client, framing.ERROR, str(e))
+                return
+            except (FileNotFoundError, IsADirectoryError):
+                send_frame(client, framing.ERROR, "File not found")
+                return
+            with f:
+                total = file_size(f)
+                offset = min(offset, total)
+                count = total - offset if length is None else min(length, total - offset)
+                send_frame(client, framing.FILE, file_header(count, total))
+                if count:
+                    with METRICS.timer("file_download_seconds"):
+                        send_file_body(client, f, offset, count)
+                    METRICS.inc("file_bytes_out", count)
+            if count:
+                print(f"📥 File downloaded: {filename} ({count} bytes at offset {offset}) to {addr}")
+        else:
+            send_frame(client, framing.ERROR, f"Unexpected {framing.NAMES.get(kind, kind)} frame")
+    
+    def start(self, engine="threads"):
         """Start all services"""
         print("🚀 Enhanced Multi-Service Server Starting...")
         print("=" * 50)
         
+        if self.metrics_port:
+            serve_prometheus(self.host, self.metrics_port)
+            print(f"📈 Prometheus metrics on http://{self.host}:{self.metrics_port}/metrics")
+        
+        if engine == "asyncio":
+            from asyncio_engine import AsyncioEngine
+            print("⚡ Engine: asyncio (single event loop)")
+            try:
+                AsyncioEngine(self).run()
+            except KeyboardInterrupt:
+                print("\n🛑 Shutting down server...")
+                self.running = False
+            return
+        
         # Start TCP Chat Server
         chat_thread = threading.Thread(target=self.tcp_chat_server)
         chat_thread.daemon = True
         chat_thread.start()
         
-        # Start UDP Info Server  
-        info_thread = threading.Thread(target=self.udp_info_server)
-        info_thread.daemon = True
-        info_thread.start()
+        # Start UDP Info Server (several receivers share the port via SO_REUSEPORT)
+        for receiver in range(1, self.udp_receivers + 1):
+            info_thread = threading.Thread(target=self.udp_info_server, args=(INFO_PORT, receiver))
+            info_thread.daemon = True
+            info_thread.start()
         
         # Start TCP File Server
         file_thread = threading.Thread(target=self.tcp_file_server)
         file_thread.daemon = True
         file_thread.start()
         
-        print("\n✅ All services started!")
-        print("📱 TCP Chat: localhost:9001")
-        print("📊 UDP Info: localhost:9002") 
-        print("📁 TCP Files: localhost:9003")
-        print("\nPress Ctrl+C to stop")
+        self.print_banner()
         
         try:
             while True:
@@ -195,7 +455,53 @@ class MultiServiceServer:
         except KeyboardInterrupt:
             print("\n🛑 Shutting down server...")
             self.running = False
+    
+    def print_banner(self):
+        """Print the service summary once everything is listening"""
+        print("\n✅ All services started!")
+        print(f"📱 TCP Chat: {self.host}:{CHAT_PORT}")
+        print(f"📊 UDP Info: {self.host}:{INFO_PORT}") 
+        print(f"📁 TCP Files: {self.host}:{FILE_PORT}")
+        print("\nPress Ctrl+C to stop")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enhanced Multi-Service Server")
+    parser.add_argument("--host", default="localhost", help="interface to bind (default: localhost)")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="threads = one thread per connection, asyncio = single event loop")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="pre-fork N worker processes sharing the ports via SO_REUSEPORT")
+    parser.add_argument("--udp-receivers", type=int, default=1,
+                        help="UDP info receiver threads per process sharing the port (threads engine)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Prometheus /metrics HTTP port, 0 = off (default: {METRICS_PORT}; +1 per worker)")
+    parser.add_argument("--udp-batch", type=int, default=BATCH,
+                        help=f"UDP datagrams drained per wakeup (default: {BATCH})")
+    parser.add_argument("--outbox-limit", type=int, default=OUTBOX_LIMIT,
+                        help=f"queued broadcasts per chat client (default: {OUTBOX_LIMIT})")
+    parser.add_argument("--slow-consumer", choices=POLICIES, default=COALESCE,
+                        help="what to do when a client's outbox is full (default: coalesce)")
+    parser.add_argument("--history-size", type=int, default=1000,
+                        help="chat messages kept in memory (default: 1000)")
+    parser.add_argument("--history-dir", default=None,
+                        help="persist chat history as segment files in this directory")
+    parser.add_argument("--history-segments", type=int, default=16,
+                        help="retention: segment files to keep (default: 16)")
+    parser.add_argument("--history-max-age", type=float, default=None,
+                        help="retention: drop segments older than this many hours")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    server = MultiServiceServer()
-    server.start()
\ No newline at end of file
+    args = parse_args()
+    history_kwargs = dict(capacity=args.history_size, log_dir=args.history_dir,
+                          max_segments=args.history_segments,
+                          max_age=args.history_max_age * 3600 if args.history_max_age else None)
+    server_kwargs = dict(host=args.host, outbox_limit=args.outbox_limit, slow_policy=args.slow_consumer,
+                         udp_receivers=args.udp_receivers, udp_batch=args.udp_batch,
+                         metrics_port=args.metrics_port)
+    if args.workers > 1:
+        from cluster import run_cluster
+        run_cluster(args.workers, args.engine, server_kwargs, history_kwargs)
+    else:
+        server = MultiServiceServer(history=ChatHistory(**history_kwargs), **server_kwargs)
+        server.start(engine=args.engine)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Streaming File Transfer Helpers
+A transfer is one header frame (UPLOAD or FILE) carrying the size, followed
+by the raw file body on the same socket. Bodies are never held in memory:
+senders hand the file to the kernel with socket.sendfile() and receivers
+recv_into() one preallocated chunk buffer, so memory per transfer is
+constant no matter how large the file is.
+
+Headers (fields separated by NUL, trailing fields optional):
+    UPLOAD    filename, size[, offset]    body is written at offset (resume)
+    DOWNLOAD  filename[, offset[, length]]
+    FILE      count, total                count body bytes follow
+A DOWNLOAD with length 0 just asks for the file's total size.
+"""
+import os
+
+CHUNK_SIZE = 256 * 1024
+MIN_RANGE = 1024 * 1024
+
+
+def send_file_body(sock, f, offset=0, count=None):
+    """Send `count` bytes of `f` starting at `offset` (zero-copy where possible)"""
+    # socket.sendfile() uses os.sendfile() on regular files and falls back
+    # to a send() loop otherwise; either way it sends everything or raises
+    if count == 0:
+        return 0
+    return sock.sendfile(f, offset, count)
+
+
+def recv_file_body(sock, decoder, f, size, buf=None):
+    """Receive exactly `size` body bytes into the open binary file `f`"""
+    buf = buf if buf is not None else bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    remaining = size
+    try:
+        # Bytes the decoder already read past the header frame come first
+        while remaining and len(decoder):
+            n = decoder.drain_into(view[:min(len(view), remaining)])
+            f.write(view[:n])
+            remaining -= n
+        while remaining:
+            n = sock.recv_into(view, min(len(view), remaining))
+            if n == 0:
+                raise ConnectionError(f"connection closed with {remaining} bytes left")
+            f.write(view[:n])
+            remaining -= n
+    finally:
+        view.release()
+    return size
+
+
+def file_size(f):
+    """Size in bytes of an open (seekable) file object, rewound to the start"""
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    return size
+
+
+def _fields(payload):
+    return [field.decode() for field in payload.split(b"\0")]
+
+
+def _number(value, what):
+    if not value.isdigit():
+        raise ValueError(f"Malformed {what}")
+    return int(value)
+
+
+def parse_upload_header(payload):
+    """Split an UPLOAD payload into (filename, size, offset)"""
+    fields = _fields(payload)
+    filename = os.path.basename(fields[0])
+    if not filename or len(fields) not in (2, 3):
+        raise ValueError("Malformed upload header")
+    size = _number(fields[1], "upload size")
+    offset = _number(fields[2], "upload offset") if len(fields) == 3 else 0
+    return filename, size, offset
+
+
+def upload_header(filename, size, offset=0):
+    fields = [os.path.basename(filename), str(size)]
+    if offset:
+        fields.append(str(offset))
+    return "\0".join(fields).encode()
+
+
+def parse_download_header(payload):
+    """Split a DOWNLOAD payload into (filename, offset, length or None)"""
+    fields = _fields(payload)
+    filename = os.path.basename(fields[0])
+    if not filename or len(fields) > 3:
+        raise ValueError("Malformed download header")
+    offset = _number(fields[1], "download offset") if len(fields) > 1 else 0
+    length = _number(fields[2], "download length") if len(fields) > 2 else None
+    return filename, offset, length
+
+
+def download_header(filename, offset=0, length=None):
+    fields = [os.path.basename(filename)]
+    if offset or length is not None:
+        fields.append(str(offset))
+    if length is not None:
+        fields.append(str(length))
+    return "\0".join(fields).encode()
+
+
+def parse_file_header(payload):
+    """Split a FILE payload into (count, total)"""
+    count, _, total = payload.partition(b"\0")
+    return int(count), int(total or count)
+
+
+def file_header(count, total):
+    return f"{count}\0{total}".encode()
+
+
+def split_ranges(total, parts, min_range=MIN_RANGE):
+    """Divide [0, total) into at most `parts` contiguous (offset, length) ranges"""
+    parts = max(1, min(parts, -(-total // min_range)))
+    step, extra = divmod(total, parts)
+    ranges, offset = [], 0
+    for i in range(parts):
+        length = step + (1 if i < extra else 0)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
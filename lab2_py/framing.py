@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Length-Prefixed Framing Protocol
+Every message on the chat and file services is one frame:
+
+    +--------+----------------+-----------------+
+    | type   | length         | payload         |
+    | 1 byte | 4 bytes (BE)   | <length> bytes  |
+    +--------+----------------+-----------------+
+
+TCP is a byte stream, so a single recv() may hold half a frame or several
+frames glued together. FrameDecoder keeps one growable buffer that sockets
+recv_into() directly and parses frames in place, so many pipelined messages
+can be decoded from one syscall without per-byte copying.
+
+The buffer starts small and only grows with bytes that actually arrived,
+so idle connections stay cheap and a header announcing a huge frame
+reserves nothing. Each service caps the payloads it accepts.
+"""
+import struct
+
+HEADER = struct.Struct("!BI")
+MAX_PAYLOAD = 1024 * 1024          # default cap (clients reading from a server)
+CHAT_MAX_PAYLOAD = 16 * 1024       # chat lines, names, channels, SINCE
+FILE_MAX_PAYLOAD = 4 * 1024        # upload/download request headers
+INITIAL_BUFFER = 256               # bytes a fresh (or idle) decoder holds
+
+# Message types
+USERNAME = 1   # server -> client: prompt, client -> server: chosen name
+TEXT = 2       # client -> server: [channel NUL] chat line
+MSG = 3        # server -> client: seq NUL channel NUL line (seq 0 = notice)
+HISTORY = 4    # server -> client: seq NUL channel NUL replayed line
+UPLOAD = 5     # client -> server: filename NUL size, then <size> raw bytes
+DOWNLOAD = 6   # client -> server: filename
+FILE = 7       # server -> client: size, then <size> raw bytes
+OK = 8         # server -> client: success message
+ERROR = 9      # server -> client: error message
+SINCE = 10     # client -> server: seq, replay every message after it
+JOIN = 11      # client -> server: channel to subscribe to
+LEAVE = 12     # client -> server: channel to unsubscribe from
+
+NAMES = {
+    USERNAME: "USERNAME", TEXT: "TEXT", MSG: "MSG", HISTORY: "HISTORY",
+    UPLOAD: "UPLOAD", DOWNLOAD: "DOWNLOAD", FILE: "FILE", OK: "OK", ERROR: "ERROR",
+    SINCE: "SINCE", JOIN: "JOIN", LEAVE: "LEAVE",
+}
+
+
+class FrameError(Exception):
+    """Raised when the peer sends a frame we cannot accept"""
+
+
+def encode_frame(kind, payload=b""):
+    """Return header + payload as one bytes object, ready for sendall()"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return HEADER.pack(kind, len(payload)) + payload
+
+
+def chat_payload(seq, channel, text):
+    """Payload of a MSG/HISTORY frame: sequence number NUL channel NUL text"""
+    return f"{seq}\0{channel}\0{text}".encode()
+
+
+def parse_chat_payload(payload):
+    """Split a MSG/HISTORY payload into (seq, channel, text)"""
+    seq, _, rest = payload.partition(b"\0")
+    channel, _, text = rest.partition(b"\0")
+    return int(seq or 0), channel.decode(errors="replace"), text.decode(errors="replace")
+
+
+def send_frame(sock, kind, payload=b""):
+    """Send one complete frame on a blocking socket"""
+    sock.sendall(encode_frame(kind, payload))
+
+
+class FrameDecoder:
+    """Incremental decoder for a stream of frames"""
+
+    def __init__(self, max_payload=MAX_PAYLOAD, size=INITIAL_BUFFER):
+        self._buf = bytearray(size)
+        self._start = 0   # first unparsed byte
+        self._end = 0     # one past the last received byte
+        self._last_read = 0
+        self.max_payload = max_payload
+
+    def __len__(self):
+        return self._end - self._start
+
+    def _reserve(self, need):
+        """Make room for at least `need` more bytes at the tail"""
+        if len(self._buf) - self._end >= need:
+            return
+        pending = self._end - self._start
+        if self._start:
+            # Slide the unparsed bytes to the front (one memmove)
+            self._buf[:pending] = self._buf[self._start:self._end]
+            self._start, self._end = 0, pending
+        if len(self._buf) - self._end < need:
+            self._buf.extend(bytes(max(need, len(self._buf))))
+
+    def _reset_if_empty(self):
+        if self._start != self._end:
+            return
+        self._start = self._end = 0
+        if len(self._buf) > max(INITIAL_BUFFER, 4 * self._last_read):
+            # Traffic dropped off (or a big frame passed): give the memory back
+            self._buf = bytearray(max(INITIAL_BUFFER, 2 * self._last_read))
+
+    def get_buffer(self, hint=4096):
+        """Writable view of free space, for sock.recv_into().
+
+        Free space grows with what has arrived (the pending bytes, or twice
+        the last read if it filled the buffer) up to `hint`; a declared
+        frame length alone never allocates anything.
+        """
+        self._reset_if_empty()
+        self._reserve(min(hint, max(INITIAL_BUFFER, len(self), 2 * self._last_read)))
+        return memoryview(self._buf)[self._end:]
+
+    def commit(self, nbytes):
+        """Mark `nbytes` written into get_buffer() as received"""
+        self._end += nbytes
+        self._last_read = nbytes
+
+    def feed(self, data):
+        """Append bytes that were received elsewhere (e.g. asyncio streams)"""
+        self._reset_if_empty()
+        self._reserve(len(data))
+        self._buf[self._end:self._end + len(data)] = data
+        self._end += len(data)
+        self._last_read = len(data)
+
+    def drain_into(self, view):
+        """Move already-buffered raw bytes into `view`; returns count moved.
+
+        Used when a frame is followed by an unframed byte stream (file
+        bodies): whatever recv_into() read past the frame is handed over
+        before reading from the socket again.
+        """
+        count = min(len(view), len(self))
+        view[:count] = memoryview(self._buf)[self._start:self._start + count]
+        self._start += count
+        return count
+
+    def recv_from(self, sock, hint=65536):
+        """recv_into() straight into the decoder; returns bytes read (0 = EOF)"""
+        view = self.get_buffer(hint)
+        try:
+            nbytes = sock.recv_into(view)
+        finally:
+            view.release()
+        self.commit(nbytes)
+        return nbytes
+
+    def next_frame(self):
+        """Return (type, payload) for the next complete frame, or None"""
+        if len(self) < HEADER.size:
+            return None
+        kind, length = HEADER.unpack_from(self._buf, self._start)
+        if length > self.max_payload:
+            raise FrameError(f"frame of {length} bytes exceeds the {self.max_payload} byte limit")
+        body = self._start + HEADER.size
+        if self._end - body < length:
+            return None
+        payload = bytes(memoryview(self._buf)[body:body + length])
+        self._start = body + length
+        return kind, payload
+
+    def frames(self):
+        """Yield every complete frame currently buffered"""
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+
+def recv_frame(sock, decoder):
+    """Block until one frame is available; returns None on EOF"""
+    while True:
+        frame = decoder.next_frame()
+        if frame is not None:
+            return frame
+        if decoder.recv_from(sock) == 0:
+            return None
+
+
+async def read_frame(reader, decoder):
+    """asyncio counterpart of recv_frame() for StreamReader"""
+    while True:
+        frame = decoder.next_frame()
+        if frame is not None:
+            return frame
+        data = await reader.read(65536)
+        if not data:
+            return None
+        decoder.feed(data)
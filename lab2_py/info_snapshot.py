@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Pre-encoded UDP Info Replies
+Each info command's reply is built and encoded once per format, then kept
+until it goes stale, so serving a request is a dict lookup on the raw
+request bytes. Replies go stale in two ways:
+
+    invalidate(command)   the server calls this when clients join/leave
+                          or change channels (USERS, CHANNELS)
+    ttl                   time-based replies (STATUS, TIME) are rebuilt
+                          at most once per tick, however many polls arrive
+
+Request: COMMAND [FORMAT], FORMAT is "json" (default) or "bin".
+
+Binary layouts (network byte order):
+    STATUS    !IQdd  active_clients, messages_sent, server_time, uptime  (times in seconds)
+    TIME      !d     server_time (Unix seconds)
+    USERS     !I count, then count x (!H length, UTF-8 name)
+    CHANNELS  !I count, then count x (!H length, UTF-8 name, !I subscribers)
+    METRICS   JSON only
+"""
+import json
+import struct
+import threading
+import time
+
+JSON = b"json"
+BINARY = b"bin"
+FORMATS = (JSON, BINARY)
+
+STATUS = struct.Struct("!IQdd")
+TIME = struct.Struct("!d")
+COUNT = struct.Struct("!I")
+NAME = struct.Struct("!H")
+
+
+def _pack_names(names, counts=None):
+    parts = [COUNT.pack(len(names))]
+    for name in names:
+        data = name.encode()[:0xFFFF]
+        parts.append(NAME.pack(len(data)) + data)
+        if counts is not None:
+            parts.append(COUNT.pack(counts[name]))
+    return b"".join(parts)
+
+
+def _unpack_names(data, with_counts=False):
+    (count,), offset = COUNT.unpack_from(data), COUNT.size
+    names, counts = [], {}
+    for _ in range(count):
+        (length,) = NAME.unpack_from(data, offset)
+        offset += NAME.size
+        name = data[offset:offset + length].decode(errors="replace")
+        offset += length
+        if with_counts:
+            counts[name] = COUNT.unpack_from(data, offset)[0]
+            offset += COUNT.size
+        names.append(name)
+    return counts if with_counts else names
+
+
+def pack_status(status):
+    return STATUS.pack(status["active_clients"], status["messages_sent"],
+                       status["server_time"], status["uptime"])
+
+
+def pack_time(info):
+    return TIME.pack(info["server_time"])
+
+
+def pack_users(users):
+    return _pack_names(users)
+
+
+def pack_channels(channels):
+    return _pack_names(sorted(channels), channels)
+
+
+def unpack_reply(command, data):
+    """Decode a binary reply (for monitoring agents and the client)"""
+    command = command.upper()
+    if command == "STATUS":
+        fields = ("active_clients", "messages_sent", "server_time", "uptime")
+        return dict(zip(fields, STATUS.unpack(data)))
+    if command == "TIME":
+        return {"server_time": TIME.unpack(data)[0]}
+    if command == "USERS":
+        return _unpack_names(data)
+    if command == "CHANNELS":
+        return _unpack_names(data, with_counts=True)
+    return data.decode(errors="replace")
+
+
+class InfoSnapshot:
+    """Cache of encoded info replies, keyed by the exact request bytes"""
+
+    def __init__(self):
+        self.sources = {}     # command -> (build, pack, ttl)
+        self.versions = {}    # command -> bumped by invalidate()
+        self.replies = {}     # request bytes -> (command, version, expires, reply)
+        self.help = b""
+        self._lock = threading.Lock()
+
+    def register(self, command, build, pack, ttl=None):
+        """`build()` returns the reply value, `pack(value)` its binary form
+        (None for JSON-only commands).
+
+        Without a ttl the reply is kept until invalidate(command).
+        """
+        command = command.encode()
+        self.sources[command] = (build, pack, ttl)
+        self.versions[command] = 0
+        names = ", ".join(c.decode() for c in self.sources)
+        self.help = json.dumps(f"Available commands: {names} (add 'bin' for binary replies)").encode()
+
+    def invalidate(self, *commands):
+        with self._lock:
+            for command in commands:
+                self.versions[command.encode()] += 1
+
+    def reply(self, request):
+        """Encoded reply for raw request bytes"""
+        cached = self.replies.get(request)
+        if cached is not None:
+            command, version, expires, reply = cached
+            if version == self.versions[command] and (expires is None or time.monotonic() < expires):
+                return reply
+        return self._refresh(request)
+
+    def _refresh(self, request):
+        command, _, fmt = request.strip().partition(b" ")
+        command, fmt = command.upper(), fmt.strip().lower() or JSON
+        if command not in self.sources or fmt not in FORMATS:
+            return self.help
+        build, pack, ttl = self.sources[command]
+        if fmt == BINARY and pack is None:
+            return self.help
+        version = self.versions[command]
+        value = build()
+        reply = json.dumps(value).encode() if fmt == JSON else pack(value)
+        expires = time.monotonic() + ttl if ttl else None
+        # Only exact request spellings are cached, so odd ones cannot grow this without bound
+        if request in (command, command + b" " + fmt):
+            self.replies[request] = (command, version, expires, reply)
+        return reply
@@ -1,39 +1,191 @@
+import argparse
+import importlib
+import selectors
 import socket
 import struct
+import sys
+import threading
 
-MULTICAST_GROUP = '224.1.1.1'
-PORT = 5007
+from broadcast import DROP, Outbox
+from multicast_protocol import MAX_DATAGRAM, MULTICAST_GROUP, PORT, ReliableReceiver
+from udp_batch import BATCH, RCVBUF, PacketStats
 
-def main():
-    # Create UDP socket
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+TICK = 0.02         # seconds between NAK timer checks
+QUEUE_LIMIT = 65536  # datagrams waiting for the consumer before the oldest are dropped
 
-    # 👇 The key part: allow multiple processes to bind to the same port
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-    except (AttributeError, OSError):
-        # Some systems don’t support it — ignore if not available
-        pass
 
-    # Bind to all interfaces (required before joining group)
-    sock.bind(('', PORT))
+class ListenerEngine:
+    """Receives any number of multicast groups on one selector loop.
 
-    # Join multicast group
-    group = socket.inet_aton(MULTICAST_GROUP)
-    mreq = struct.pack('4sL', group, socket.INADDR_ANY)
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    The loop only ever does non-blocking receives into preallocated
+    buffers, repair bookkeeping and a queue append; the consumer runs on
+    its own thread and gets batches of (sender addr, seq, [messages]).
+    If it falls behind, the bounded queue drops the oldest datagrams and
+    counts them instead of stalling the sockets.
+    """
 
-    print(f"👂 Listening for multicast messages on {MULTICAST_GROUP}:{PORT}...\n")
+    def __init__(self, groups, consumer, rcvbuf=RCVBUF, queue_limit=QUEUE_LIMIT,
+                 reliable=True, stats_every=10.0):
+        self.consumer = consumer
+        self.rcvbuf = rcvbuf
+        self.selector = selectors.DefaultSelector()
+        self.sockets = {}           # port -> socket, shared by every group on that port
+        self.queue = Outbox(queue_limit, DROP)
+        self.stats = PacketStats("multicast", stats_every)
+        self.plain = 0              # datagrams without the messenger header
+        self.buffer = bytearray(MAX_DATAGRAM)
+        self.view = memoryview(self.buffer)
 
-    try:
+        # NAKs go out and repairs come back on a private port: with several
+        # listeners sharing a group port, a unicast repair could reach the wrong one
+        self.repair_sock = self.open_socket(0, reuse=False)
+        self.receiver = ReliableReceiver(self.enqueue, self.repair_sock.sendto) if reliable else None
+        for group, port in groups:
+            self.join(group, port)
+
+    def open_socket(self, port, reuse=True):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        if reuse:
+            # 👇 The key part: allow multiple processes to bind to the same port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except (AttributeError, OSError):
+                # Some systems don’t support it — ignore if not available
+                pass
+        try:
+            # Bursts wait in the kernel instead of being dropped there
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        except OSError:
+            pass
+        sock.bind(('', port))
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ)
+        return sock
+
+    def join(self, group, port):
+        sock = self.sockets.get(port)
+        if sock is None:
+            sock = self.sockets[port] = self.open_socket(port)
+        mreq = struct.pack('4sL', socket.inet_aton(group), socket.INADDR_ANY)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+    def enqueue(self, addr, seq, messages):
+        self.queue.put((addr, seq, messages))
+
+    def drain(self, sock):
+        """Receive up to one batch of waiting datagrams from `sock`"""
+        packets = nbytes = 0
+        for _ in range(BATCH):
+            try:
+                n, addr = sock.recvfrom_into(self.view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.stats.errors += 1
+                break
+            packets += 1
+            nbytes += n
+            data = self.view[:n]
+            if self.receiver is None or not self.receiver.datagram(data, addr):
+                # Plain datagram from an older messenger (or reliability off)
+                self.plain += 1
+                self.enqueue(addr, 0, [bytes(data)])
+            data.release()
+        if packets:
+            self.stats.record(packets, nbytes, 0)
+
+    def consume_loop(self):
         while True:
-            data, addr = sock.recvfrom(1024)
-            print(f"[{addr[0]}] {data.decode()}")
+            batch = self.queue.take()
+            if not batch:
+                return
+            try:
+                self.consumer(batch)
+            except Exception as e:
+                print(f"❌ Consumer error: {e}", file=sys.stderr)
+
+    def run(self):
+        worker = threading.Thread(target=self.consume_loop, name="consumer", daemon=True)
+        worker.start()
+        try:
+            while True:
+                for key, _ in self.selector.select(TICK):
+                    self.drain(key.fileobj)
+                if self.receiver is not None:
+                    self.receiver.tick()
+        finally:
+            self.queue.close()
+            worker.join(timeout=1)
+            self.selector.close()
+            for sock in [self.repair_sock, *self.sockets.values()]:
+                sock.close()
+
+    def summary(self):
+        lines = [f"{self.stats.packets} datagrams received, {self.queue.dropped} dropped by the consumer queue"]
+        if self.receiver is not None:
+            lines.append(self.receiver.stats())
+        return "; ".join(lines)
+
+
+def print_consumer(batch):
+    """Default consumer: one line per message, written in a single call per batch"""
+    lines = []
+    for addr, seq, messages in batch:
+        tag = f"{addr[0]} #{seq}" if seq else addr[0]
+        lines.extend(f"[{tag}] {message.decode(errors='replace')}\n" for message in messages)
+    sys.stdout.write("".join(lines))
+    sys.stdout.flush()
+
+
+def count_consumer(batch):
+    """Discard messages (throughput testing; the stats line still reports rates)"""
+
+
+CONSUMERS = {"print": print_consumer, "count": count_consumer}
+
+
+def load_consumer(spec):
+    """A built-in consumer name or "module:function" taking a batch"""
+    if spec in CONSUMERS:
+        return CONSUMERS[spec]
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name or "consume")
+
+
+def parse_group(text):
+    group, _, port = text.partition(":")
+    return group or MULTICAST_GROUP, int(port or PORT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multicast Listener")
+    parser.add_argument("--group", action="append", type=parse_group, metavar="GROUP[:PORT]",
+                        help=f"group to join, repeatable (default: {MULTICAST_GROUP}:{PORT})")
+    parser.add_argument("--consumer", default="print",
+                        help="print, count, or module:function called with each batch (default: print)")
+    parser.add_argument("--queue", type=int, default=QUEUE_LIMIT,
+                        help=f"datagrams buffered for the consumer before dropping (default: {QUEUE_LIMIT})")
+    parser.add_argument("--rcvbuf", type=int, default=RCVBUF, help="socket receive buffer in bytes")
+    parser.add_argument("--unreliable", action="store_true", help="no gap detection or NAK repair")
+    parser.add_argument("--stats-every", type=float, default=0,
+                        help="seconds between rate summaries, 0 = off")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    groups = args.group or [(MULTICAST_GROUP, PORT)]
+    engine = ListenerEngine(groups, load_consumer(args.consumer), args.rcvbuf, args.queue,
+                            not args.unreliable, args.stats_every)
+
+    names = ", ".join(f"{group}:{port}" for group, port in groups)
+    print(f"👂 Listening for multicast messages on {names}...\n")
+
+    try:
+        engine.run()
     except KeyboardInterrupt:
-        print("\nListener closed.")
-    finally:
-        sock.close()
+        print(f"\nListener closed: {engine.summary()}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Load Generator & Benchmarks for the lab2_py Socket Services
+Drives the servers with the same protocols the bundled clients speak and
+reports throughput, p50/p99/p999 latency and error counts.
+
+    python3 loadgen.py chat  --clients 2000 --senders 50 --rate 500 --duration 10
+    python3 loadgen.py udp   --target echo --rate 20000 --concurrency 64 --duration 10
+    python3 loadgen.py files --sizes 4K,1M,64M --concurrency 4 --repeat 3
+
+Add --json results.json to write a machine-readable report (one object
+per run) that can be compared between releases.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import framing
+from framing import FrameDecoder, encode_frame, parse_chat_payload, read_frame
+from enhanced_client import MultiServiceClient
+from config import CHAT_PORT, INFO_PORT, FILE_PORT
+from asyncio_engine import raise_fd_limit
+import udp_echo_client
+import udp_time_client
+
+UDP_TARGETS = {
+    # name: (default port, request builder(seq) -> bytes, reply carries seq?)
+    "echo": (udp_echo_client.SERVER_PORT, lambda seq: f"{udp_echo_client.MESSAGE} #{seq}".encode(), True),
+    "time": (udp_time_client.SERVER_PORT, lambda seq: udp_time_client.REQUEST, False),
+    "info": (INFO_PORT, lambda seq: b"STATUS", False),
+}
+BENCH_TAG = "bench:"
+
+
+class Recorder:
+    """Collects latency samples, byte counts and error counts for one run"""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.errors = Counter()
+        self.ops = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, seconds, nbytes=0):
+        self.samples.append(seconds)
+        self.ops += 1
+        self.bytes += nbytes
+
+    def error(self, kind):
+        self.errors[kind] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def report(self, params, extra=None):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        samples = sorted(self.samples)
+
+        def pct(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 3)
+
+        result = {
+            "scenario": self.name,
+            "params": params,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "duration_s": round(elapsed, 3),
+            "ops": self.ops,
+            "throughput_ops_s": round(self.ops / elapsed, 1) if elapsed else 0,
+            "throughput_mb_s": round(self.bytes / elapsed / 1e6, 2) if elapsed else 0,
+            "latency_ms": {
+                "p50": pct(50), "p99": pct(99), "p999": pct(99.9),
+                "max": round(samples[-1] * 1000, 3) if samples else None,
+                "mean": round(sum(samples) / len(samples) * 1000, 3) if samples else None,
+            },
+            "errors": dict(self.errors),
+        }
+        result.update(extra or {})
+        return result
+
+
+def print_report(result):
+    lat = result["latency_ms"]
+    print(f"\n📈 {result['scenario']} - {result['ops']} ops in {result['duration_s']}s")
+    print(f"   throughput: {result['throughput_ops_s']} ops/s, {result['throughput_mb_s']} MB/s")
+    print(f"   latency ms: p50={lat['p50']} p99={lat['p99']} p999={lat['p999']} max={lat['max']}")
+    for key, value in result.items():
+        if key not in ("scenario", "params", "timestamp", "host", "duration_s", "ops",
+                       "throughput_ops_s", "throughput_mb_s", "latency_ms", "errors"):
+            print(f"   {key}: {value}")
+    print(f"   errors: {result['errors'] or 'none'}")
+
+
+# ---------------------------------------------------------------- chat
+
+async def chat_client(args, index, rec, connect_rec, ready, stop):
+    """One chat connection: handshake, join its room, count deliveries"""
+    t0 = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        decoder = FrameDecoder()
+        if await read_frame(reader, decoder) is None:
+            raise ConnectionError("closed during handshake")
+        room = f"bench-{index // args.room_size}"
+        writer.write(encode_frame(framing.USERNAME, f"bench{index}") + encode_frame(framing.JOIN, room))
+        await writer.drain()
+    except OSError as e:
+        connect_rec.error(type(e).__name__)
+        return None
+    connect_rec.record(time.perf_counter() - t0)
+    ready.append((writer, room))
+
+    async def receive():
+        while not stop.is_set():
+            frame = await read_frame(reader, decoder)
+            if frame is None:
+                rec.error("disconnected")
+                return
+            kind, payload = frame
+            if kind != framing.MSG:
+                continue
+            _, channel, text = parse_chat_payload(payload)
+            if BENCH_TAG in text:
+                sent_ns = int(text.rsplit(BENCH_TAG, 1)[1])
+                rec.record((time.time_ns() - sent_ns) / 1e9, len(payload))
+
+    return asyncio.create_task(receive())
+
+
+async def chat_sender(writer, room, interval, deadline, sent):
+    next_send = time.perf_counter()
+    while time.perf_counter() < deadline:
+        text = f"{BENCH_TAG}{time.time_ns()}"
+        writer.write(encode_frame(framing.TEXT, f"{room}\0{text}"))
+        sent[0] += 1
+        next_send += interval
+        await asyncio.sleep(max(0, next_send - time.perf_counter()))
+        if writer.transport.get_write_buffer_size() > 1 << 20:
+            await writer.drain()
+
+
+async def run_chat(args):
+    raise_fd_limit()
+    rec, connect_rec = Recorder("chat-delivery"), Recorder("chat-connect")
+    ready, stop, gate = [], asyncio.Event(), asyncio.Semaphore(args.connect_batch)
+
+    async def connect(i):
+        async with gate:
+            return await chat_client(args, i, rec, connect_rec, ready, stop)
+
+    print(f"🔌 Opening {args.clients} chat connections to {args.host}:{args.port}...")
+    readers = [t for t in await asyncio.gather(*(connect(i) for i in range(args.clients))) if t]
+    connect_rec.stop()
+    print(f"   {len(ready)} connected, p99 connect {connect_rec.report({})['latency_ms']['p99']} ms")
+    await asyncio.sleep(1)   # let join notices settle
+
+    rec.samples.clear()
+    rec.started = time.perf_counter()
+    senders = ready[:args.senders]
+    sent = [0]
+    deadline = time.perf_counter() + args.duration
+    interval = len(senders) / args.rate if args.rate else 0
+    await asyncio.gather(*(chat_sender(w, room, interval, deadline, sent) for w, room in senders))
+    await asyncio.sleep(args.drain)
+    rec.stop()
+    stop.set()
+    for task in readers:
+        task.cancel()
+    for writer, _ in ready:
+        writer.close()
+
+    room_members = Counter(room for _, room in ready)
+    sender_rooms = Counter(room for _, room in senders)
+    expected = sum(count * (room_members[room] - 1) for room, count in sender_rooms.items())
+    expected = expected * sent[0] // max(1, len(senders))
+    params = {k: getattr(args, k) for k in ("host", "port", "clients", "senders", "rate", "duration", "room_size")}
+    return [
+        connect_rec.report(params, {"connected": len(ready)}),
+        rec.report(params, {"messages_sent": sent[0], "expected_deliveries": expected,
+                            "delivery_ratio": round(rec.ops / expected, 4) if expected else None}),
+    ]
+
+
+# ---------------------------------------------------------------- udp
+
+class UDPProbe(asyncio.DatagramProtocol):
+    """One socket with at most one request in flight"""
+
+    def __init__(self, build, carries_seq):
+        self.build = build
+        self.carries_seq = carries_seq
+        self.transport = None
+        self.waiter = None
+        self.seq = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.waiter and not self.waiter.done():
+            if not self.carries_seq or data.endswith(f"#{self.seq}".encode()):
+                self.waiter.set_result(len(data))
+
+    def error_received(self, exc):
+        if self.waiter and not self.waiter.done():
+            self.waiter.set_exception(exc)
+
+    async def request(self, timeout):
+        self.seq += 1
+        self.waiter = asyncio.get_running_loop().create_future()
+        self.transport.sendto(self.build(self.seq))
+        return await asyncio.wait_for(self.waiter, timeout)
+
+
+async def run_udp(args):
+    default_port, build, carries_seq = UDP_TARGETS[args.target]
+    port = args.port or default_port
+    loop = asyncio.get_running_loop()
+    rec = Recorder(f"udp-{args.target}")
+    deadline = time.perf_counter() + args.duration
+    per_probe = args.concurrency / args.rate if args.rate else 0
+
+    async def probe_loop():
+        _, probe = await loop.create_datagram_endpoint(lambda: UDPProbe(build, carries_seq),
+                                                       remote_addr=(args.host, port))
+        next_send = time.perf_counter()
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                nbytes = await probe.request(args.timeout)
+                rec.record(time.perf_counter() - t0, nbytes)
+            except asyncio.TimeoutError:
+                rec.error("timeout")
+            except OSError as e:
+                rec.error(type(e).__name__)
+            next_send += per_probe
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        probe.transport.close()
+
+    print(f"📡 UDP {args.target} on {args.host}:{port}: {args.concurrency} sockets, "
+          f"target {args.rate or 'max'} req/s for {args.duration}s")
+    await asyncio.gather(*(probe_loop() for _ in range(args.concurrency)))
+    rec.stop()
+    params = {"host": args.host, "port": port, "target": args.target, "rate": args.rate,
+              "concurrency": args.concurrency, "duration": args.duration}
+    return [rec.report(params)]
+
+
+# ---------------------------------------------------------------- files
+
+def parse_size(text):
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class PatternFile(io.RawIOBase):
+    """Seekable read-only file of `size` bytes generated on the fly"""
+
+    def __init__(self, size, block=os.urandom(64 * 1024)):
+        self.size = size
+        self.block = block
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def readinto(self, buf):
+        n = min(len(buf), self.size - self.pos, len(self.block))
+        buf[:n] = self.block[:n]
+        self.pos += n
+        return n
+
+
+class NullSink(io.RawIOBase):
+    """Writable file that discards everything (downloads are only timed)"""
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return 0
+
+    def truncate(self, size=None):
+        return 0
+
+    def write(self, data):
+        return len(data)
+
+
+def run_files(args):
+    client = MultiServiceClient()
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    results = []
+    for size in sizes:
+        up, down = Recorder(f"file-upload-{size}"), Recorder(f"file-download-{size}")
+
+        def transfer(i):
+            name = f"bench_{size}_{i}.bin"
+            t0 = time.perf_counter()
+            try:
+                ok, message = client.upload(args.host, args.port, PatternFile(size), name)
+                if not ok:
+                    raise ConnectionError(message)
+                up.record(time.perf_counter() - t0, size)
+            except OSError as e:
+                up.error(type(e).__name__)
+                return
+            t0 = time.perf_counter()
+            try:
+                ok, result = client.download(args.host, args.port, name, NullSink())
+                if not ok:
+                    raise ConnectionError(result)
+                down.record(time.perf_counter() - t0, result[0])
+            except OSError as e:
+                down.error(type(e).__name__)
+
+        print(f"📁 {args.repeat * args.concurrency} x {size} bytes, {args.concurrency} at a time")
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(transfer, range(args.repeat * args.concurrency)))
+        up.stop()
+        down.stop()
+        params = {"host": args.host, "port": args.port, "size": size,
+                  "concurrency": args.concurrency, "repeat": args.repeat}
+        results += [up.report(params), down.report(params)]
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the lab2_py socket services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--json", help="append machine-readable results to this file")
+    # Also accepted after the subcommand; SUPPRESS keeps a subcommand from resetting it
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", default=argparse.SUPPRESS,
+                        help="append machine-readable results to this file")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    chat = sub.add_parser("chat", parents=[common], help="many concurrent chat connections")
+    chat.add_argument("--port", type=int, default=CHAT_PORT)
+    chat.add_argument("--clients", type=int, default=1000)
+    chat.add_argument("--senders", type=int, default=10, help="clients that also send")
+    chat.add_argument("--rate", type=float, default=100, help="total messages/s across senders")
+    chat.add_argument("--duration", type=float, default=10)
+    chat.add_argument("--room-size", type=int, default=100, help="clients per bench channel")
+    chat.add_argument("--connect-batch", type=int, default=200, help="concurrent connects")
+    chat.add_argument("--drain", type=float, default=2, help="seconds to wait for deliveries")
+
+    udp = sub.add_parser("udp", parents=[common], help="request/response rate against a UDP server")
+    udp.add_argument("--target", choices=sorted(UDP_TARGETS), default="echo")
+    udp.add_argument("--port", type=int, default=None, help="default depends on --target")
+    udp.add_argument("--rate", type=float, default=0, help="total requests/s (0 = as fast as possible)")
+    udp.add_argument("--concurrency", type=int, default=32, help="sockets, one request in flight each")
+    udp.add_argument("--duration", type=float, default=10)
+    udp.add_argument("--timeout", type=float, default=1.0)
+
+    files = sub.add_parser("files", parents=[common], help="upload + download files of several sizes")
+    files.add_argument("--port", type=int, default=FILE_PORT)
+    files.add_argument("--sizes", default="4K,1M,16M")
+    files.add_argument("--concurrency", type=int, default=4)
+    files.add_argument("--repeat", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.scenario == "chat":
+        results = asyncio.run(run_chat(args))
+    elif args.scenario == "udp":
+        results = asyncio.run(run_udp(args))
+    else:
+        results = run_files(args)
+
+    for result in results:
+        print_report(result)
+    if args.json:
+        with open(args.json, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        print(f"\n💾 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,137 @@
-import socket
-import struct
+import argparse
+import os
+import queue
 import sys
+import threading
+import time
 
-MULTICAST_GROUP = '224.1.1.1'
-PORT = 5007
+from multicast_protocol import (LINGER, MTU, MULTICAST_GROUP, PORT, REPAIR_LINGER, RETRANSMIT_BUFFER,
+                                Publisher, multicast_sender)
+
+READ_HINT = 64 * 1024       # max bytes the reader thread takes from the input per read
 
-def main():
-   
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-    ttl = struct.pack('b', 1)
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
 
+def interactive(publisher):
     print(" Multicast Messenger started.")
     print("Type messages and press Enter to send to the group.")
     print("Press Ctrl+C to stop.\n")
 
+    while True:
+        message = input("> ")
+        if not message:
+            continue
+        publisher.publish(message.encode())
+        publisher.flush()
+
+
+def read_lines(fd, lines, stop):
+    """Reader thread: hand complete lines to the sender as soon as they arrive (None = end).
+
+    os.read returns whatever the pipe holds instead of waiting for a full
+    chunk, so a slow producer's lines go out within `linger`, and it takes
+    no lock of the buffered stdin object that could wedge interpreter shutdown.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                lines.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    tail = b""
+    try:
+        while not stop.is_set():
+            data = os.read(fd, READ_HINT)
+            if not data:
+                break
+            chunk = (tail + data).split(b"\n")
+            tail = chunk.pop()      # partial last line waits for its newline
+            if chunk:
+                put(chunk)
+        if tail:
+            put([tail])
+    finally:
+        put(None)
+
+
+def publish_stream(publisher, stream, linger=LINGER):
+    """Publish every line of a binary stream; partial batches wait at most `linger`"""
+    lines = queue.Queue(maxsize=64)     # backpressure when the pacer is the bottleneck
+    stop = threading.Event()
+    reader = threading.Thread(target=read_lines, args=(stream.fileno(), lines, stop), daemon=True)
+    reader.start()
+
     try:
         while True:
-            message = input("> ")
-            if not message:
+            timeout = None
+            if publisher.pending:
+                timeout = max(0, linger - (time.monotonic() - publisher.oldest))
+            try:
+                chunk = lines.get(timeout=timeout)
+            except queue.Empty:
+                publisher.flush()       # input went quiet: don't hold messages back
                 continue
-            sock.sendto(message.encode(), (MULTICAST_GROUP, PORT))
-    except KeyboardInterrupt:
+            if chunk is None:
+                break
+            for line in chunk:
+                line = line.rstrip(b"\r")
+                if line:
+                    publisher.publish(line)
+        publisher.flush()
+    finally:
+        stop.set()
+        reader.join(timeout=0.2)    # may still sit in os.read on a terminal; that's harmless
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multicast Messenger")
+    parser.add_argument("--group", default=MULTICAST_GROUP)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--ttl", type=int, default=1, help="multicast hops (default: 1 = local network)")
+    parser.add_argument("--publish", metavar="FILE", nargs="?", const="-",
+                        help="publisher mode: send every line of FILE (or stdin / a pipe if '-')")
+    parser.add_argument("--mtu", type=int, default=MTU,
+                        help=f"datagram size messages are packed into (default: {MTU})")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="datagrams per second (default: 0 = unpaced)")
+    parser.add_argument("--linger", type=float, default=LINGER,
+                        help=f"max seconds a partial datagram waits for more lines (default: {LINGER})")
+    parser.add_argument("--retransmit", type=int, default=RETRANSMIT_BUFFER,
+                        help=f"datagrams kept for NAK repair, 0 = unreliable (default: {RETRANSMIT_BUFFER})")
+    parser.add_argument("--repair-linger", type=float, default=REPAIR_LINGER,
+                        help=f"seconds to keep answering NAKs after the input ends (default: {REPAIR_LINGER})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sock = multicast_sender(args.ttl)
+    publisher = Publisher(sock, args.group, args.port, args.mtu, args.rate, args.retransmit)
+    start = time.perf_counter()
+    elapsed = None
+
+    try:
+        if args.publish is None:
+            interactive(publisher)
+        elif args.publish == "-":
+            publish_stream(publisher, sys.stdin.buffer, args.linger)
+        else:
+            with open(args.publish, "rb") as f:
+                publish_stream(publisher, f, args.linger)
+        elapsed = time.perf_counter() - start
+        publisher.close(args.repair_linger)
+    except (KeyboardInterrupt, EOFError):
+        publisher.close(0)
         print("\nMessenger closed.")
     finally:
+        if elapsed is None:
+            elapsed = time.perf_counter() - start
         sock.close()
 
+    if args.publish is not None and publisher.datagrams:
+        print(f"📤 Published {publisher.stats()} to {args.group}:{args.port} in {elapsed:.2f}s "
+              f"({publisher.datagrams / elapsed if elapsed else 0:.0f} datagrams/s)", file=sys.stderr)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Server Metrics
+Counters and latency histograms cheap enough to sit on the hot paths.
+Every thread records into its own shard (threading.local), so recording
+never takes a lock; a scrape sums the shards, folding those of finished
+threads into a retired total so thread-per-connection churn loses nothing.
+
+Histograms are log-linear like HdrHistogram: values are microseconds,
+exact below 16us, then 8 sub-buckets per power of two (at most 12.5%
+error) up to 2^40us, in a fixed list of ints per thread.
+
+Exposed as JSON through the UDP METRICS command and as Prometheus text
+(counters as *_total, histograms as summaries) on --metrics-port.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BITS = 3
+SUB_BUCKETS = 1 << SUB_BITS
+LINEAR = SUB_BUCKETS * 2          # values below this get their own bucket
+MAX_VALUE = 1 << 40
+BUCKETS = (MAX_VALUE.bit_length() - SUB_BITS) * SUB_BUCKETS
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+PRUNE_AFTER = 256                 # new threads registered before dead shards are folded
+
+
+def bucket_index(value):
+    if value < LINEAR:
+        return max(0, value)
+    shift = min(value, MAX_VALUE - 1).bit_length() - SUB_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (min(value, MAX_VALUE - 1) >> shift) - SUB_BUCKETS
+
+
+def bucket_upper(index):
+    """Largest value that lands in bucket `index`"""
+    if index < LINEAR:
+        return index
+    shift, sub = divmod(index, SUB_BUCKETS)
+    return ((sub + SUB_BUCKETS + 1) << (shift - 1)) - 1
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bucket_index(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Upper bound (seconds) of the bucket holding the q-th value"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(bucket_upper(index) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        out = {"count": self.count, "mean": self.sum / self.count if self.count else 0.0}
+        out.update((f"p{str(q * 100).rstrip('0').rstrip('.')}", self.quantile(q)) for q in QUANTILES)
+        out["max"] = self.max
+        return out
+
+
+class Shard:
+    """One thread's counters and histograms"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.help = {}
+        self.gauges = {}              # name -> (fn, prometheus type)
+        self._local = threading.local()
+        self._shards = []             # (thread, shard)
+        self._retired = Shard()
+        self._prune_at = PRUNE_AFTER  # len(_shards) that triggers the next fold
+        self._lock = threading.Lock()
+        self._last_rates = (time.monotonic(), {})
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                # Fold finished threads here too, so short-lived threads don't
+                # pile up when nothing scrapes. Only once the list has doubled
+                # since the last fold: the O(threads) walk then costs O(1)
+                # per registration instead of O(threads)
+                if len(self._shards) >= self._prune_at:
+                    self._prune()
+            return shard
+
+    def _prune(self):
+        """Fold shards of threads that have exited into _retired (lock held)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._fold(self._retired, shard)
+        self._shards = live
+        self._prune_at = max(PRUNE_AFTER, 2 * len(live))
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, n=1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        histograms = self._shard().histograms
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.record(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def gauge(self, name, fn, text=None, kind="gauge"):
+        """Value computed at scrape time (kind "counter" for running totals)"""
+        self.gauges[name] = (fn, kind)
+        if text:
+            self.help[name] = text
+
+    def collect(self):
+        """Summed counters and merged histograms across all threads"""
+        counters, histograms = {}, {}
+        with self._lock:
+            self._prune()
+            shards = [self._retired] + [shard for _, shard in self._shards]
+            for shard in shards:
+                # Copies: the owning threads keep writing while we sum
+                for name, value in list(shard.counters.items()):
+                    counters[name] = counters.get(name, 0) + value
+                for name, histogram in list(shard.histograms.items()):
+                    histograms.setdefault(name, Histogram()).merge(histogram)
+        return counters, histograms
+
+    @staticmethod
+    def _fold(into, shard):
+        for name, value in shard.counters.items():
+            into.counters[name] = into.counters.get(name, 0) + value
+        for name, histogram in shard.histograms.items():
+            into.histograms.setdefault(name, Histogram()).merge(histogram)
+
+    def _gauge_values(self):
+        values = {}
+        for name, (fn, _) in list(self.gauges.items()):
+            try:
+                values[name] = fn()
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self):
+        """JSON-friendly view with per-second rates since the previous snapshot"""
+        counters, histograms = self.collect()
+        now = time.monotonic()
+        with self._lock:
+            last_time, last = self._last_rates
+            self._last_rates = (now, counters)
+        elapsed = now - last_time
+        rates = {f"{name}_per_second": round((value - last.get(name, 0)) / elapsed, 2)
+                 for name, value in counters.items()} if elapsed > 0 else {}
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "counters": counters,
+            "rates": rates,
+            "gauges": self._gauge_values(),
+            "latency_seconds": {name: h.summary() for name, h in histograms.items()},
+        }
+
+    def prometheus(self, prefix="chatserver_"):
+        """Prometheus text exposition format"""
+        counters, histograms = self.collect()
+        lines = []
+
+        def header(name, kind, key):
+            if key in self.help:
+                lines.append(f"# HELP {name} {self.help[key]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        header(f"{prefix}uptime_seconds", "gauge", "uptime_seconds")
+        lines.append(f"{prefix}uptime_seconds {time.time() - self.started:.3f}")
+        for name, value in sorted(counters.items()):
+            header(f"{prefix}{name}_total", "counter", name)
+            lines.append(f"{prefix}{name}_total {value}")
+        for name, value in sorted(self._gauge_values().items()):
+            kind = self.gauges[name][1]
+            metric = f"{prefix}{name}" + ("_total" if kind == "counter" else "")
+            header(metric, kind, name)
+            lines.append(f"{metric} {value}")
+        for name, histogram in sorted(histograms.items()):
+            header(f"{prefix}{name}", "summary", name)
+            for q in QUANTILES:
+                lines.append(f'{prefix}{name}{{quantile="{q}"}} {histogram.quantile(q):.6f}')
+            lines.append(f"{prefix}{name}_sum {histogram.sum:.6f}")
+            lines.append(f"{prefix}{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def json(self):
+        return json.dumps(self.snapshot())
+
+
+# One registry per process (cluster workers each expose their own)
+METRICS = Metrics()
+
+
+class PrometheusHandler(BaseHTTPRequestHandler):
+    metrics = METRICS
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the console
+
+
+def serve_prometheus(host, port, metrics=METRICS):
+    """Serve GET /metrics from a daemon thread; returns the HTTP server"""
+    handler = type("Handler", (PrometheusHandler,), {"metrics": metrics})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Multicast Messenger Protocol
+Shared by messenger.py (sender) and listener.py (receivers).
+
+Small messages are packed into MTU-sized datagrams, each stamped with the
+sender's session id and a per-datagram sequence number:
+
+    header   magic "MC" | version | type | session (4) | seq (8) | count (2)
+    body     count x (length (2) | message bytes)
+
+The session id is random per sender run, so a restarted sender starts a
+new sequence instead of looking like a giant jump. Datagrams that do not
+start with the magic (e.g. from an older messenger) are treated as one
+plain-text message.
+
+Reliability (NAK-based repair):
+
+    DATA       multicast; the sender keeps the last RETRANSMIT_BUFFER datagrams
+    HEARTBEAT  multicast when idle, carrying the latest seq, so listeners
+               notice loss at the tail of a burst too
+    NAK        listener -> sender, unicast: ranges (first, last) of missing seqs
+    LOST       sender -> listener, unicast: ranges no longer in the buffer
+
+Repairs are the original DATA datagrams resent unicast to the listener's
+repair socket. Listeners deliver in sequence order, retry NAKs with
+exponential backoff and then report the gap as lost instead of stalling
+forever. Sessions a listener has not heard from (no DATA, no HEARTBEAT) for
+STREAM_IDLE seconds are dropped, so departed senders don't accumulate.
+"""
+import os
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b"MC"
+VERSION = 1
+DATA = 1
+HEARTBEAT = 2
+NAK = 3
+LOST = 4
+
+HEADER = struct.Struct("!2sBBIQH")
+LENGTH = struct.Struct("!H")
+RANGE = struct.Struct("!QQ")
+
+MULTICAST_GROUP = "224.1.1.1"
+PORT = 5007
+MTU = 1400                  # payload budget that avoids IP fragmentation on Ethernet
+MAX_DATAGRAM = 65507
+MAX_MESSAGE = 0xFFFF
+LINGER = 0.05               # seconds a partial batch may wait for more messages
+RETRANSMIT_BUFFER = 8192    # datagrams the sender can still repair
+HEARTBEAT_EVERY = 0.5       # seconds of sender silence before a heartbeat
+REPAIR_LINGER = 2.0         # seconds a finished publisher keeps answering NAKs
+NAK_DELAY = 0.01            # grace for reordering before the first NAK
+NAK_INTERVAL = 0.1          # first NAK retry delay, doubled after every retry
+NAK_RETRIES = 6
+MAX_GAP = 65536             # a bigger jump is treated as a resync, not a gap
+STREAM_IDLE = 30.0          # seconds of sender silence before a listener forgets its session
+MAX_RANGES = (MTU - 18) // 18
+
+
+def new_session():
+    return struct.unpack("!I", os.urandom(4))[0]
+
+
+def pack_datagram(session, seq, messages, kind=DATA):
+    parts = [HEADER.pack(MAGIC, VERSION, kind, session, seq, len(messages))]
+    for message in messages:
+        parts.append(LENGTH.pack(len(message)))
+        parts.append(message)
+    return b"".join(parts)
+
+
+def unpack_datagram(data):
+    """(kind, session, seq, [messages]), or None for a plain-text datagram"""
+    if len(data) < HEADER.size or data[:2] != MAGIC:
+        return None
+    magic, version, kind, session, seq, count = HEADER.unpack_from(data)
+    if version != VERSION:
+        return None
+    messages, offset = [], HEADER.size
+    for _ in range(count):
+        if offset + LENGTH.size > len(data):
+            break
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        messages.append(bytes(data[offset:offset + length]))
+        offset += length
+    return kind, session, seq, messages
+
+
+def pack_ranges(kind, session, seqs):
+    """NAK/LOST datagrams covering sorted `seqs`, as few ranges as possible"""
+    ranges = []
+    for seq in seqs:
+        if ranges and ranges[-1][1] == seq - 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return [pack_datagram(session, 0, [RANGE.pack(*r) for r in ranges[i:i + MAX_RANGES]], kind)
+            for i in range(0, len(ranges), MAX_RANGES)]
+
+
+def unpack_ranges(messages):
+    """Expand the (first, last) ranges of a NAK/LOST datagram into seqs"""
+    for message in messages:
+        if len(message) == RANGE.size:
+            first, last = RANGE.unpack(message)
+            yield from range(first, min(last, first + MAX_GAP) + 1)
+
+
+def multicast_sender(ttl=1, loopback=True):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack("b", ttl))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, int(loopback))
+    sock.bind(("", 0))      # NAKs come back to this port
+    return sock
+
+
+class Pacer:
+    """Spaces sends `1/rate` seconds apart, allowing a short burst after idling"""
+
+    def __init__(self, rate, burst=8):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.burst = burst
+        self.next_time = time.perf_counter()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        # Don't bank more than `burst` sends worth of idle time
+        self.next_time = max(self.next_time, now - self.burst * self.interval)
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time += self.interval
+
+
+class Publisher:
+    """Batches messages into datagrams and sends them, paced, to the group"""
+
+    def __init__(self, sock, group=MULTICAST_GROUP, port=PORT, mtu=MTU, rate=0,
+                 retransmit=RETRANSMIT_BUFFER):
+        self.sock = sock
+        self.addr = (group, port)
+        self.mtu = mtu
+        self.pacer = Pacer(rate)
+        self.session = new_session()
+        self.seq = 0
+        self.pending = []
+        self.pending_bytes = HEADER.size
+        self.oldest = None          # when the first pending message was queued
+        self.messages = 0
+        self.datagrams = 0
+        self.bytes = 0
+        self.oversized = 0
+        self.retransmit = retransmit
+        self.history = {}           # seq -> datagram, the last `retransmit` sent
+        self.last_send = time.monotonic()
+        self.repairs = 0
+        self.naks = 0
+        self.running = True
+        self.repairer = None
+        if retransmit:
+            self.repairer = threading.Thread(target=self.repair_loop, daemon=True)
+            self.repairer.start()
+
+    def publish(self, message):
+        """Queue one message (bytes); sends whenever a datagram fills up"""
+        size = LENGTH.size + len(message)
+        if len(message) > MAX_MESSAGE or HEADER.size + size > MAX_DATAGRAM:
+            self.oversized += 1
+            return
+        if self.pending and self.pending_bytes + size > self.mtu:
+            self.flush()
+        if not self.pending:
+            self.oldest = time.monotonic()
+        self.pending.append(message)
+        self.pending_bytes += size
+        if self.pending_bytes >= self.mtu:
+            self.flush()   # a single message at or above the MTU goes alone
+
+    def due(self, linger=LINGER):
+        """True if a partial batch has waited `linger` seconds"""
+        return bool(self.pending) and time.monotonic() - self.oldest >= linger
+
+    def flush(self):
+        if not self.pending:
+            return
+        seq = self.seq + 1
+        datagram = pack_datagram(self.session, seq, self.pending)
+        self.pacer.wait()
+        self.send(datagram)
+        # Only now may the repair thread see it: a heartbeat for `seq` before
+        # the DATA is out would make listeners NAK a datagram still on its way
+        if self.retransmit:
+            self.history[seq] = datagram
+            self.history.pop(seq - self.retransmit, None)
+        self.seq = seq
+        self.messages += len(self.pending)
+        self.datagrams += 1
+        self.bytes += len(datagram)
+        self.pending = []
+        self.pending_bytes = HEADER.size
+        self.oldest = None
+
+    def send(self, datagram):
+        self.sock.sendto(datagram, self.addr)
+        self.last_send = time.monotonic()
+
+    def repair_loop(self):
+        """Answer NAKs and send heartbeats (runs next to the publishing thread)"""
+        self.sock.settimeout(HEARTBEAT_EVERY / 2)
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(MAX_DATAGRAM)
+            except socket.timeout:
+                data = None
+            except OSError:
+                if not self.running:
+                    return
+                continue
+            if data:
+                packet = unpack_datagram(data)
+                if packet and packet[0] == NAK and packet[1] == self.session:
+                    self.repair(packet[3], addr)
+            if self.seq and time.monotonic() - self.last_send >= HEARTBEAT_EVERY:
+                self.heartbeat()
+
+    def repair(self, ranges, addr):
+        self.naks += 1
+        gone = []
+        for seq in unpack_ranges(ranges):
+            datagram = self.history.get(seq)
+            if datagram is None:
+                gone.append(seq)
+                continue
+            self.sock.sendto(datagram, addr)
+            self.repairs += 1
+        for datagram in pack_ranges(LOST, self.session, gone):
+            self.sock.sendto(datagram, addr)
+
+    def heartbeat(self):
+        self.send(pack_datagram(self.session, self.seq, [], HEARTBEAT))
+
+    def close(self, linger=REPAIR_LINGER):
+        """Flush, then keep answering NAKs for `linger` seconds so listeners can repair the tail"""
+        self.flush()
+        if self.repairer:
+            if self.seq:
+                self.heartbeat()
+                time.sleep(linger)
+            self.running = False
+            self.repairer.join()
+
+    def stats(self):
+        avg = self.messages / self.datagrams if self.datagrams else 0
+        return (f"{self.messages} messages in {self.datagrams} datagrams "
+                f"({avg:.1f} per datagram, {self.bytes} bytes)"
+                + (f", {self.oversized} oversized skipped" if self.oversized else "")
+                + (f", {self.repairs} repairs for {self.naks} NAKs" if self.naks else ""))
+
+
+class Stream:
+    """Receive state for one sender session"""
+
+    def __init__(self, seq):
+        self.next = seq             # next seq to deliver
+        self.highest = seq - 1      # highest seq seen (data or heartbeat)
+        self.buffer = {}            # out-of-order datagrams: seq -> messages
+        self.missing = {}           # seq -> (next NAK time, NAKs sent)
+        self.heard = time.monotonic()   # last DATA or HEARTBEAT from the sender
+
+
+class ReliableReceiver:
+    """In-order delivery with gap detection and NAK repair, for any number of senders.
+
+    `deliver(addr, seq, messages)` gets each datagram's messages once, in order;
+    `send(datagram, addr)` must send unicast from the listener's repair socket.
+    """
+
+    def __init__(self, deliver, send, max_buffer=RETRANSMIT_BUFFER):
+        self.deliver = deliver
+        self.send = send
+        self.max_buffer = max_buffer
+        self.streams = {}           # (sender addr, session) -> Stream
+        self.received = 0
+        self.duplicates = 0
+        self.repaired = 0
+        self.naks = 0
+        self.lost = 0
+        self.expired = 0
+        self.next_sweep = time.monotonic() + STREAM_IDLE
+
+    def datagram(self, data, addr):
+        """Feed one datagram from the group or the repair socket; False if not ours"""
+        packet = unpack_datagram(data)
+        if packet is None:
+            return False
+        kind, session, seq, messages = packet
+        key = (addr, session)
+        if kind == DATA:
+            self.on_data(key, seq, messages)
+        elif kind == HEARTBEAT:
+            stream = self.streams.get(key)
+            if stream is not None:
+                stream.heard = time.monotonic()
+                self.note_seq(stream, seq)
+        elif kind == LOST:
+            stream = self.streams.get(key)
+            if stream is not None:
+                self.give_up(key, stream, [s for s in unpack_ranges(messages) if s in stream.missing])
+        return True
+
+    def on_data(self, key, seq, messages):
+        stream = self.streams.get(key)
+        if stream is None:
+            # Late joiner: start from whatever arrives first, no history
+            stream = self.streams[key] = Stream(seq)
+        elif seq - stream.next > MAX_GAP:
+            # Too far ahead to be loss we can repair: resync
+            self.lost += len(stream.missing)
+            stream = self.streams[key] = Stream(seq)
+        stream.heard = time.monotonic()
+        if seq < stream.next or seq in stream.buffer:
+            self.duplicates += 1
+            return
+        self.received += 1
+        if stream.missing.pop(seq, (0, 0))[1]:
+            self.repaired += 1
+        stream.buffer[seq] = messages
+        self.note_seq(stream, seq)
+        self.advance(key, stream)
+        if len(stream.buffer) > self.max_buffer:
+            # Can't hold more behind a gap: give up on the oldest missing seqs
+            self.give_up(key, stream, sorted(stream.missing)[:len(stream.buffer) - self.max_buffer])
+
+    def note_seq(self, stream, seq):
+        """Register everything between the highest seq seen and `seq` as missing"""
+        if seq > stream.highest:
+            when = time.monotonic() + NAK_DELAY
+            for missing in range(max(stream.highest + 1, stream.next), seq):
+                if missing not in stream.buffer:
+                    stream.missing[missing] = (when, 0)
+            if seq not in stream.buffer and seq >= stream.next:
+                # Heartbeat for a datagram we never got
+                stream.missing.setdefault(seq, (when, 0))
+            stream.highest = seq
+
+    def advance(self, key, stream):
+        while True:
+            messages = stream.buffer.pop(stream.next, None)
+            if messages is not None:
+                self.deliver(key[0], stream.next, messages)
+            elif stream.next in stream.missing or stream.next > stream.highest:
+                return
+            stream.next += 1
+
+    def give_up(self, key, stream, seqs):
+        for seq in seqs:
+            stream.missing.pop(seq, None)
+        self.lost += len(seqs)
+        self.advance(key, stream)
+
+    def tick(self):
+        """Send due NAKs and give up on exhausted gaps; call every few ms"""
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.expire(now)
+        for key, stream in list(self.streams.items()):
+            due, exhausted = [], []
+            for seq, (when, tries) in stream.missing.items():
+                if when > now:
+                    continue
+                if tries >= NAK_RETRIES:
+                    exhausted.append(seq)
+                else:
+                    due.append(seq)
+                    # Back off: a busy listener may still have the repair queued
+                    stream.missing[seq] = (now + NAK_INTERVAL * 2 ** tries, tries + 1)
+            if exhausted:
+                self.give_up(key, stream, exhausted)
+            for datagram in pack_ranges(NAK, key[1], sorted(due)):
+                self.naks += 1
+                try:
+                    self.send(datagram, key[0])
+                except OSError:
+                    pass
+
+    def expire(self, now):
+        """Forget sessions silent for STREAM_IDLE seconds, delivering what they still buffer"""
+        for key, stream in list(self.streams.items()):
+            if now - stream.heard >= STREAM_IDLE:
+                self.give_up(key, stream, sorted(stream.missing))
+                del self.streams[key]
+                self.expired += 1
+        self.next_sweep = now + STREAM_IDLE / 4
+
+    def stats(self):
+        return (f"{self.received} datagrams, {self.repaired} repaired via {self.naks} NAKs, "
+                f"{self.lost} lost, {self.duplicates} duplicates"
+                + (f", {self.expired} idle senders forgotten" if self.expired else ""))
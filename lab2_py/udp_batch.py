@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Batched UDP Serving
+One wakeup drains every datagram already waiting on the socket (up to a
+batch) into preallocated buffers with recvfrom_into(), computes all the
+replies, then sends them back to back. Python has no recvmmsg/sendmmsg,
+so this is the nearest equivalent: one blocking wait per batch instead
+of one per packet, no per-packet allocation for the request, and no
+print() on the hot path.
+
+Per-packet logging is replaced by PacketStats: plain counters owned by
+the receiving thread (so no locks), summarised every few seconds, plus
+an optional 1-in-N request sample.
+
+Handlers get (request memoryview, addr) and return reply bytes or None.
+The view points into a reused buffer and is only valid during the call,
+but replies go out before the next receive, so an echo may return it as-is.
+"""
+import errno
+import multiprocessing
+import socket
+import time
+
+BATCH = 64
+DATAGRAM = 2048
+RCVBUF = 4 * 1024 * 1024
+REPORT_EVERY = 10.0
+RECV_BACKOFF = 0.1      # seconds a blocking receiver pauses after an unexpected receive error
+
+# Errors left behind by ICMP replies to earlier sends: the next receive works normally
+ICMP_ERRORS = {errno.ECONNREFUSED, errno.ECONNRESET, errno.EHOSTUNREACH, errno.ENETUNREACH}
+CLOSED_ERRORS = {errno.EBADF, errno.ENOTSOCK}
+
+# Non-blocking receive on a blocking socket; without it we fall back to one packet per wakeup
+DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+class PacketStats:
+    """Aggregated packet counters for one receiver, printed periodically"""
+
+    def __init__(self, name, interval=REPORT_EVERY, sample=0):
+        self.name = name
+        self.interval = interval    # seconds between summaries, 0 = silent
+        self.sample = sample        # log 1 request in `sample`, 0 = never
+        self.packets = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.errors = 0
+        self._countdown = sample
+        self._last_time = time.monotonic()
+        self._last_packets = 0
+
+    def record(self, packets, bytes_in, bytes_out):
+        self.packets += packets
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, packets)
+        if self.interval:
+            now = time.monotonic()
+            if now - self._last_time >= self.interval:
+                self.report(now)
+
+    def sampled(self):
+        """True for one packet in `sample` (the caller logs that one)"""
+        if not self.sample:
+            return False
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.sample
+        return True
+
+    def report(self, now=None):
+        now = now or time.monotonic()
+        rate = (self.packets - self._last_packets) / (now - self._last_time)
+        avg = self.packets / self.batches if self.batches else 0
+        print(f"📈 {self.name}: {rate:,.0f} pkt/s, {self.packets:,} total, "
+              f"avg batch {avg:.1f} (max {self.largest_batch}), "
+              f"{self.bytes_in:,} B in / {self.bytes_out:,} B out, {self.errors} errors")
+        self._last_time = now
+        self._last_packets = self.packets
+
+    def snapshot(self):
+        return {"packets": self.packets, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                "batches": self.batches, "errors": self.errors}
+
+
+class BatchedUDP:
+    """Receive, handle and answer datagrams on `sock` a batch at a time"""
+
+    def __init__(self, sock, handle, stats, batch=BATCH, size=DATAGRAM):
+        self.sock = sock
+        self.handle = handle
+        self.stats = stats
+        self.batch = batch if DONTWAIT else 1
+        self.buffers = [bytearray(size) for _ in range(self.batch)]
+        self.views = [memoryview(buf) for buf in self.buffers]
+
+    def drain(self, block=False):
+        """Answer up to one batch of waiting datagrams; returns how many.
+
+        With `block` the first receive waits for traffic; on a non-blocking
+        socket (the asyncio engine's add_reader callback) it never does.
+        """
+        received = []
+        flags = 0 if block else DONTWAIT
+        for view in self.views:
+            try:
+                n, addr = self.sock.recvfrom_into(view, 0, flags)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self.stats.errors += 1   # e.g. ICMP port unreachable from an earlier reply
+                if block and not received:
+                    if e.errno in CLOSED_ERRORS:
+                        raise
+                    if e.errno not in ICMP_ERRORS:
+                        time.sleep(RECV_BACKOFF)    # e.g. ENOBUFS: don't spin on it
+                break
+            received.append((view[:n], addr))
+            flags = DONTWAIT
+        if not received:
+            return 0
+
+        replies = []
+        bytes_in = 0
+        for data, addr in received:
+            bytes_in += len(data)
+            if self.stats.sampled():
+                print(f"📡 {self.stats.name} request from {addr}: {bytes(data[:80])!r}")
+            try:
+                reply = self.handle(data, addr)
+            except Exception as e:
+                self.stats.errors += 1
+                print(f"❌ {self.stats.name} handler error: {e}")
+                continue
+            if reply is not None:
+                replies.append((reply, addr))
+
+        bytes_out = 0
+        for reply, addr in replies:
+            try:
+                bytes_out += self.sock.sendto(reply, addr)
+            except OSError:
+                self.stats.errors += 1
+        for data, _ in received:
+            data.release()
+        self.stats.record(len(received), bytes_in, bytes_out)
+        return len(received)
+
+    def serve_forever(self, running=lambda: True):
+        """Blocking receive loop for a dedicated thread or process; returns once the socket is closed"""
+        self.sock.setblocking(True)
+        while running():
+            try:
+                self.drain(block=True)
+            except OSError:
+                return      # closed underneath the loop
+
+
+def bind_udp(host, port, reuse_port=False, rcvbuf=RCVBUF):
+    """UDP socket with a large receive buffer, optionally SO_REUSEPORT"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if rcvbuf:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        except OSError:
+            pass  # capped by net.core.rmem_max; the default still works
+    sock.bind((host, port))
+    return sock
+
+
+def _worker(name, host, port, make_handler, batch, interval, sample, reuse_port):
+    sock = bind_udp(host, port, reuse_port)
+    stats = PacketStats(name, interval, sample)
+    try:
+        BatchedUDP(sock, make_handler(), stats, batch).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+def serve_udp(name, host, port, make_handler, workers=1, batch=BATCH,
+              interval=REPORT_EVERY, sample=0):
+    """Run a batched UDP service with `workers` SO_REUSEPORT receiver processes.
+
+    `make_handler()` is called inside each worker, so per-worker caches
+    need no sharing.
+    """
+    if workers <= 1:
+        _worker(name, host, port, make_handler, batch, interval, sample, False)
+        return
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("Multiple receivers need SO_REUSEPORT")
+    procs = [multiprocessing.Process(target=_worker, name=f"{name}-{i}",
+                                     args=(f"{name} #{i}", host, port, make_handler,
+                                           batch, interval, sample, True))
+             for i in range(1, workers + 1)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.join()
+
+
+def add_arguments(parser):
+    """Command-line options shared by the batched UDP servers"""
+    parser.add_argument("--workers", type=int, default=1,
+                        help="receiver processes sharing the port via SO_REUSEPORT")
+    parser.add_argument("--batch", type=int, default=BATCH,
+                        help=f"datagrams drained per wakeup (default: {BATCH})")
+    parser.add_argument("--stats-every", type=float, default=REPORT_EVERY,
+                        help="seconds between counter summaries, 0 = off")
+    parser.add_argument("--log-sample", type=int, default=0,
+                        help="log one request in N (default: 0 = no per-packet logging)")
@@ -2,12 +2,18 @@ import socket
 
 SERVER_IP = "127.0.0.1"
 SERVER_PORT = 9001
+MESSAGE = "Hello from Python UDP client"
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-message = "Hello from Python UDP client"
-sock.sendto(message.encode(), (SERVER_IP, SERVER_PORT))
+def echo(message=MESSAGE, host=SERVER_IP, port=SERVER_PORT, timeout=None):
+    """Send one datagram to the echo server and return the reply"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        sock.sendto(message.encode(), (host, port))
+        data, addr = sock.recvfrom(1024)
+    finally:
+        sock.close()
+    return data.decode()
 
-data, addr = sock.recvfrom(1024)
-print(f"Server replied: {data.decode()}")
-
-sock.close()
+if __name__ == "__main__":
+    print(f"Server replied: {echo()}")
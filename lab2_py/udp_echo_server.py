@@ -1,14 +1,23 @@
-import socket
+import argparse
+
+from udp_batch import add_arguments, serve_udp
 
 IP = "0.0.0.0"
 PORT = 9001
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((IP, PORT))
 
-print(f"UDP Echo Server listening on {IP}:{PORT}")
+def make_echo_handler():
+    # The request view is still valid when the batch is sent, so echo it back uncopied
+    return lambda data, addr: data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP Echo Server")
+    parser.add_argument("--host", default=IP)
+    parser.add_argument("--port", type=int, default=PORT)
+    add_arguments(parser)
+    args = parser.parse_args()
 
-while True:
-    data, addr = sock.recvfrom(1024)
-    print(f"Received from {addr}: {data.decode()}")
-    sock.sendto(data, addr) 
+    print(f"UDP Echo Server listening on {args.host}:{args.port} ({args.workers} receiver(s))")
+    serve_udp("UDP echo", args.host, args.port, make_echo_handler, args.workers,
+              args.batch, args.stats_every, args.log_sample)
@@ -2,11 +2,18 @@ import socket
 
 SERVER_IP = "127.0.0.1"
 SERVER_PORT = 9002
+REQUEST = b"time?"
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.sendto(b"time?", (SERVER_IP, SERVER_PORT))
+def get_time(host=SERVER_IP, port=SERVER_PORT, timeout=None):
+    """Ask the time server for its current time"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        sock.sendto(REQUEST, (host, port))
+        data, addr = sock.recvfrom(1024)
+    finally:
+        sock.close()
+    return data.decode()
 
-data, addr = sock.recvfrom(1024)
-print(f"Server time: {data.decode()}")
-
-sock.close()
+if __name__ == "__main__":
+    print(f"Server time: {get_time()}")
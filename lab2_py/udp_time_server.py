@@ -1,17 +1,32 @@
-import socket
-import datetime
+import argparse
+import time
+
+from udp_batch import add_arguments, serve_udp
 
 IP = "0.0.0.0"
 PORT = 9002
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((IP, PORT))
 
-print(f"UDP Time Server listening on {IP}:{PORT}")
+def make_time_handler():
+    # The reply only changes once a second, so encode it once per second
+    cache = [None, b""]
+
+    def handle(data, addr):
+        now = int(time.time())
+        if cache[0] != now:
+            current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            cache[:] = [now, f"Current server time: {current_time}".encode()]
+        return cache[1]
+    return handle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP Time Server")
+    parser.add_argument("--host", default=IP)
+    parser.add_argument("--port", type=int, default=PORT)
+    add_arguments(parser)
+    args = parser.parse_args()
 
-while True:
-    data, addr = sock.recvfrom(1024)
-    print(f"Received time request from {addr}")
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    response = f"Current server time: {current_time}"
-    sock.sendto(response.encode(), addr)
+    print(f"UDP Time Server listening on {args.host}:{args.port} ({args.workers} receiver(s))")
+    serve_udp("UDP time", args.host, args.port, make_time_handler, args.workers,
+              args.batch, args.stats_every, args.log_sample)
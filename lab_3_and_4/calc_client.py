@@ -0,0 +1,162 @@
+"""
+Client library for the Calculator service (lab3.py).
+
+One CalculatorClient keeps a pool of keep-alive connections, retries
+connection errors and 5xx/429 replies with exponential backoff, and
+records the latency of every request. Many operations go out either as
+/api/batch requests (when the server has that endpoint) or, failing
+that, as single calls spread over a thread pool sharing the same pool.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "http://127.0.0.1:5000"
+POOL_SIZE = 16          # keep-alive connections, also the default number of worker threads
+TIMEOUT = 5.0
+RETRIES = 3
+BACKOFF = 0.1           # seconds before the first retry, doubled each time
+BATCH_SIZE = 10_000     # operations per /api/batch request
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CalculatorError(Exception):
+    pass
+
+
+class LatencyStats:
+    """Thread-safe request latency recorder"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.retries = 0
+        self.failures = 0
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def percentile(self, p):
+        with self.lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def summary(self):
+        return (f"{len(self.latencies)} requests, {self.retries} retries, {self.failures} failed; "
+                f"p50 {self.percentile(50) * 1000:.1f} ms, p99 {self.percentile(99) * 1000:.1f} ms")
+
+
+def _json(response):
+    """Decoded reply body; a non-JSON reply (proxy error page) is an error"""
+    try:
+        data = response.json()
+    except ValueError:
+        raise CalculatorError(f"HTTP {response.status_code}: {response.text[:200]}")
+    if response.status_code != 200:
+        raise CalculatorError(data.get("error", response.text))
+    return data
+
+
+class CalculatorClient:
+    def __init__(self, base_url=BASE_URL, pool_size=POOL_SIZE, timeout=TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = LatencyStats()
+        self.has_batch = None       # unknown until the first batch request
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, path, **kwargs):
+        """Send one request, retrying transient failures; returns the final response"""
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.base_url + path, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error, response = e, None
+            else:
+                error = None
+            self.stats.record(time.perf_counter() - start)
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.retries:
+                break
+            with self.stats.lock:
+                self.stats.retries += 1
+            # Full jitter, so a fleet of clients doesn't retry in lockstep
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        with self.stats.lock:
+            self.stats.failures += 1
+        if response is not None:
+            return response
+        raise CalculatorError(f"Calculator unreachable: {error}")
+
+    def calculate(self, operation, a, b):
+        """Result of one operation (raises CalculatorError)"""
+        response = self.request("GET", f"/api/{operation}", params={"a": a, "b": b})
+        return _json(response)["result"]
+
+    def map(self, operations, workers=None):
+        """Single calls in parallel; (results, errors) like batch()"""
+        def call(operation):
+            try:
+                return self.calculate(*operation), None
+            except CalculatorError as e:
+                return None, str(e)
+
+        with ThreadPoolExecutor(workers or self.pool_size) as pool:
+            outcomes = list(pool.map(call, operations))
+        results = [result for result, _ in outcomes]
+        errors = [(i, error) for i, (_, error) in enumerate(outcomes) if error is not None]
+        return results, errors
+
+    def batch(self, operations, workers=None):
+        """Evaluate (operation, a, b) tuples; returns (results, errors).
+
+        Failed operations get None in `results` and an (index, message)
+        entry in `errors`. Uses /api/batch when the server has it and
+        falls back to parallel single calls otherwise.
+        """
+        operations = list(operations)
+        if self.has_batch is False:
+            return self.map(operations, workers)
+        results, errors = [], []
+        for offset in range(0, len(operations), BATCH_SIZE):
+            chunk = operations[offset:offset + BATCH_SIZE]
+            response = self.request("POST", "/api/batch", json={
+                "ops": [op for op, _, _ in chunk],
+                "a": [a for _, a, _ in chunk],
+                "b": [b for _, _, b in chunk],
+            })
+            if response.status_code in (404, 405) and self.has_batch is None:
+                self.has_batch = False      # older server: remember and fall back
+                return self.map(operations, workers)
+            data = _json(response)
+            self.has_batch = True
+            results.extend(data["results"])
+            errors.extend((offset + e["index"], e["error"]) for e in data["errors"])
+        return results, errors
@@ -0,0 +1,247 @@
+"""
+Safe arithmetic expressions for the Calculator API.
+
+Expressions are parsed with Python's own parser and then checked against
+a whitelist (numbers, variables, + - * / // % **, unary minus and a few
+math functions), so nothing else -- attribute access, names like
+__import__, comprehensions -- can ever run. Each expression is compiled
+once into a tree of closures and kept in an LRU cache keyed by its text.
+
+The same compiled expression evaluates one set of variables, many
+bindings in a loop, or -- with NumPy -- whole columns of values at once.
+"""
+import ast
+import math
+import operator
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_LENGTH = 1000
+MAX_NODES = 200
+CACHE_SIZE = 1024
+
+DIVIDE_BY_ZERO = "Cannot divide by zero"
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _divide(a, b):
+    if b == 0:
+        raise ExpressionError(DIVIDE_BY_ZERO)
+    return a / b
+
+
+def _floordiv(a, b):
+    if b == 0:
+        raise ExpressionError(DIVIDE_BY_ZERO)
+    return a // b
+
+
+def _mod(a, b):
+    if b == 0:
+        raise ExpressionError(DIVIDE_BY_ZERO)
+    return a % b
+
+
+def _power(a, b):
+    try:
+        return math.pow(a, b)
+    except OverflowError:
+        raise ExpressionError("Result too large")
+
+
+SCALAR_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: _divide, ast.FloorDiv: _floordiv, ast.Mod: _mod, ast.Pow: _power,
+}
+SCALAR_FUNCTIONS = {
+    "abs": abs, "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "log10": math.log10,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "floor": math.floor, "ceil": math.ceil,
+    "round": lambda x, digits=0: round(x, int(digits)), "min": min, "max": max,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+# (min, max) arguments; None = any number
+FUNCTION_ARITY = dict.fromkeys(SCALAR_FUNCTIONS, (1, 1))
+FUNCTION_ARITY.update(round=(1, 2), min=(2, None), max=(2, None), log=(1, 2))
+
+# Key under which a vectorized run keeps its divide-by-zero mask
+# (variable names can never contain NUL)
+ERRORS = "\0errors"
+
+
+def _vector_divide(ufunc):
+    def apply(env, a, b):
+        zero = np.asarray(b) == 0
+        if zero.any():
+            env[ERRORS] |= np.broadcast_to(zero, env[ERRORS].shape)
+        return ufunc(a, np.where(zero, 1.0, b))
+    return apply
+
+
+if np is not None:
+    VECTOR_OPERATORS = {
+        ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Pow: np.power,
+        ast.Div: _vector_divide(np.divide), ast.FloorDiv: _vector_divide(np.floor_divide),
+        ast.Mod: _vector_divide(np.mod),
+    }
+    VECTOR_FUNCTIONS = {name: getattr(np, name) for name in
+                        ("abs", "sqrt", "exp", "log10", "sin", "cos", "tan", "floor", "ceil")}
+    VECTOR_FUNCTIONS.update(
+        min=lambda *args: np.minimum.reduce(np.broadcast_arrays(*args)),
+        max=lambda *args: np.maximum.reduce(np.broadcast_arrays(*args)),
+        log=lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+        round=lambda x, digits=0: np.round(x, int(np.asarray(digits).flat[0])),
+    )
+
+
+def _check(tree):
+    nodes = 0
+    for node in ast.walk(tree):
+        nodes += 1
+        if nodes > MAX_NODES:
+            raise ExpressionError("Expression too complex")
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"Unsupported constant {node.value!r}")
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in SCALAR_FUNCTIONS:
+                raise ExpressionError("Unknown function")
+            if node.keywords:
+                raise ExpressionError("Keyword arguments are not supported")
+            low, high = FUNCTION_ARITY[node.func.id]
+            if len(node.args) < low or (high is not None and len(node.args) > high):
+                raise ExpressionError(f"Wrong number of arguments to {node.func.id}()")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in SCALAR_OPERATORS:
+                raise ExpressionError("Unsupported operator")
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.UAdd, ast.USub)):
+                raise ExpressionError("Unsupported operator")
+        elif not isinstance(node, (ast.Expression, ast.Name, ast.Load, ast.operator, ast.unaryop)):
+            raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+
+class CompiledExpression:
+    """A checked expression tree compiled to closures (the vector form on first use)"""
+
+    def __init__(self, text, tree):
+        self.text = text
+        self.tree = tree
+        functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        self.variables = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)
+                                 and id(node) not in functions and node.id not in CONSTANTS})
+        self.scalar = self._build(tree.body, vector=False)
+        self._vector = None
+
+    @property
+    def vector(self):
+        if self._vector is None:
+            self._vector = self._build(self.tree.body, vector=True)
+        return self._vector
+
+    def _build(self, node, vector):
+        """Closure computing `node` from a variables mapping"""
+        if isinstance(node, ast.Constant):
+            value = float(node.value)
+            return lambda env: value
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                value = CONSTANTS[node.id]
+                return lambda env: value
+            name = node.id
+
+            def variable(env):
+                try:
+                    return env[name]
+                except KeyError:
+                    raise ExpressionError(f"Missing variable '{name}'")
+            return variable
+        if isinstance(node, ast.UnaryOp):
+            operand = self._build(node.operand, vector)
+            if isinstance(node.op, ast.USub):
+                return lambda env: -operand(env)
+            return operand
+        if isinstance(node, ast.BinOp):
+            left, right = self._build(node.left, vector), self._build(node.right, vector)
+            kind = type(node.op)
+            if not vector:
+                op = SCALAR_OPERATORS[kind]
+                return lambda env: op(left(env), right(env))
+            op = VECTOR_OPERATORS[kind]
+            if kind in (ast.Div, ast.FloorDiv, ast.Mod):
+                return lambda env: op(env, left(env), right(env))
+            return lambda env: op(left(env), right(env))
+        # ast.Call (validated by _check)
+        function = (VECTOR_FUNCTIONS if vector else SCALAR_FUNCTIONS)[node.func.id]
+        args = [self._build(arg, vector) for arg in node.args]
+        return lambda env: function(*[arg(env) for arg in args])
+
+    def evaluate(self, variables):
+        """Value for one set of variables (raises ExpressionError)"""
+        try:
+            result = float(self.scalar(variables))
+        except (ValueError, OverflowError, TypeError) as e:
+            if isinstance(e, ExpressionError):
+                raise
+            raise ExpressionError(f"Math error: {e}")
+        if math.isnan(result) or math.isinf(result):
+            raise ExpressionError("Result is not a finite number")
+        return result
+
+    def evaluate_many(self, bindings):
+        """(results, errors) for a list of variable mappings; errors are (index, message)"""
+        results, errors = [], []
+        for index, variables in enumerate(bindings):
+            try:
+                results.append(self.evaluate(variables))
+            except ExpressionError as e:
+                results.append(None)
+                errors.append((index, str(e)))
+        return results, errors
+
+    def evaluate_columns(self, columns):
+        """Like evaluate_many, for {name: list or scalar} with NumPy when available"""
+        lengths = {len(v) for v in columns.values() if isinstance(v, (list, tuple))}
+        if len(lengths) > 1:
+            raise ExpressionError("All variable columns must have the same length")
+        size = lengths.pop() if lengths else 1
+        missing = [name for name in self.variables if name not in columns]
+        if missing:
+            raise ExpressionError(f"Missing variable '{missing[0]}'")
+        if np is None:
+            rows = [{name: (value[i] if isinstance(value, (list, tuple)) else value)
+                     for name, value in columns.items()} for i in range(size)]
+            return self.evaluate_many(rows)
+
+        try:
+            env = {name: np.asarray(value, dtype=np.float64) for name, value in columns.items()}
+        except (TypeError, ValueError):
+            raise ExpressionError("Variables must be numbers")
+        divided_by_zero = env[ERRORS] = np.zeros(size, dtype=bool)
+        with np.errstate(all="ignore"):
+            values = np.broadcast_to(np.asarray(self.vector(env), dtype=np.float64), (size,))
+        results = values.tolist()
+        errors = []
+        for index in np.flatnonzero(divided_by_zero | ~np.isfinite(values)).tolist():
+            results[index] = None
+            errors.append((index, DIVIDE_BY_ZERO if divided_by_zero[index] else "Result is not a finite number"))
+        return results, errors
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(text):
+    """Parse, check and compile an expression; cached by its exact text"""
+    if len(text) > MAX_LENGTH:
+        raise ExpressionError(f"Expression longer than {MAX_LENGTH} characters")
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except (SyntaxError, ValueError, RecursionError):
+        raise ExpressionError("Invalid expression syntax")
+    _check(tree)
+    return CompiledExpression(text, tree)
@@ -1,7 +1,35 @@
-from flask import Flask, request, jsonify, render_template_string
+import math
+import struct
+
+from flask import Flask, request, jsonify, render_template_string, Response
+
+from expressions import ExpressionError, compile_expression
+
+try:
+    import numpy as np
+except ImportError:  # batches still work, element by element
+    np = None
 
 app = Flask(__name__)
 
+# Batch operation codes (binary bodies); JSON bodies use the names
+OPERATIONS = ["add", "subtract", "multiply", "divide"]
+OP_CODES = {name: code for code, name in enumerate(OPERATIONS, 1)}
+MIXED = 0
+
+# Per-element status in batch replies
+OK, DIVIDE_BY_ZERO, UNKNOWN_OPERATION, NOT_FINITE = 0, 1, 2, 3
+STATUS_ERRORS = {DIVIDE_BY_ZERO: "Cannot divide by zero", UNKNOWN_OPERATION: "Unknown operation",
+                 NOT_FINITE: "Result is not a finite number"}
+
+MAX_BATCH = 1_000_000
+BINARY_TYPE = "application/octet-stream"
+# Binary request:  "CALC" | op code (0 = mixed) | count, then count op codes if mixed,
+#                  count float64 a, count float64 b (all little-endian)
+# Binary response: "CALC" | 0 | count, then count float64 results, count status bytes
+BATCH_HEADER = struct.Struct("<4sBI")
+BATCH_MAGIC = b"CALC"
+
 class Calculator:
     @staticmethod
     def add(a, b): return a + b
@@ -39,6 +67,194 @@ def operate(operation):
     except Exception:
         return jsonify({"error": "Invalid input"}), 400
 
+def evaluate_batch(codes, a, b):
+    """Evaluate op code(s) over operand sequences; returns (results, statuses).
+
+    `codes` is one op code for every element or a sequence of codes.
+    Failed elements get NaN and a non-zero status instead of failing the batch;
+    an overflowing result (inf/NaN) keeps its value but is flagged NOT_FINITE.
+    """
+    if np is not None:
+        return _evaluate_numpy(codes, a, b)
+    a, b = list(map(float, a)), list(map(float, b))
+    n = len(a)
+    codes = [codes] * n if isinstance(codes, int) else codes
+    functions = [None, Calculator.add, Calculator.subtract, Calculator.multiply, Calculator.divide]
+    results, statuses = [0.0] * n, bytearray(n)
+    for i, (code, x, y) in enumerate(zip(codes, a, b)):
+        if not 0 < code < len(functions):
+            results[i], statuses[i] = float("nan"), UNKNOWN_OPERATION
+        elif code == OP_CODES["divide"] and y == 0:
+            results[i], statuses[i] = float("nan"), DIVIDE_BY_ZERO
+        else:
+            results[i] = functions[code](x, y)
+            if not math.isfinite(results[i]):
+                statuses[i] = NOT_FINITE
+    return results, bytes(statuses)
+
+
+def _evaluate_numpy(codes, a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    codes = np.broadcast_to(np.asarray(codes, dtype=np.uint8), a.shape)
+    results = np.full(a.shape, np.nan)
+    statuses = np.full(a.shape, UNKNOWN_OPERATION, dtype=np.uint8)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for code, ufunc in ((1, np.add), (2, np.subtract), (3, np.multiply), (4, np.divide)):
+            mask = codes == code
+            if mask.all():
+                mask = slice(None)      # single-operation batch: no gather/scatter
+            elif not mask.any():
+                continue
+            results[mask] = ufunc(a[mask], b[mask])
+            statuses[mask] = OK
+        zero = (codes == OP_CODES["divide"]) & (b == 0)
+        results[zero] = np.nan
+        statuses[zero] = DIVIDE_BY_ZERO
+    statuses[(statuses == OK) & ~np.isfinite(results)] = NOT_FINITE
+    return results, statuses.tobytes()
+
+
+def parse_batch_json(body):
+    """{"op": "add" | ["add", "divide", ...], "a": [...], "b": [...]}"""
+    ops, a, b = body.get("op", body.get("ops")), body.get("a"), body.get("b")
+    if not isinstance(a, list) or not isinstance(b, list) or len(a) != len(b):
+        raise ValueError("'a' and 'b' must be lists of equal length")
+    if None in a or None in b:
+        # NumPy would quietly read null as NaN
+        raise ValueError("Operands must be numbers")
+    if isinstance(ops, str):
+        if ops not in OP_CODES:
+            raise ValueError("Unknown operation")
+        codes = OP_CODES[ops]
+    elif isinstance(ops, list) and len(ops) == len(a):
+        codes = [OP_CODES.get(op, 255) for op in ops]
+    else:
+        raise ValueError("'op' must be an operation name or a list with one per element")
+    return codes, a, b
+
+
+def parse_batch_binary(data):
+    if len(data) < BATCH_HEADER.size:
+        raise ValueError("Truncated batch header")
+    magic, op, count = BATCH_HEADER.unpack_from(data)
+    if magic != BATCH_MAGIC:
+        raise ValueError("Bad batch magic")
+    if count > MAX_BATCH:
+        raise ValueError(f"Batch larger than {MAX_BATCH} operations")
+    offset = BATCH_HEADER.size
+    codes_size = count if op == MIXED else 0
+    if len(data) != offset + codes_size + 16 * count:
+        raise ValueError("Batch body size does not match count")
+    if np is not None:
+        codes = np.frombuffer(data, np.uint8, codes_size, offset) if op == MIXED else op
+        a = np.frombuffer(data, "<f8", count, offset + codes_size)
+        b = np.frombuffer(data, "<f8", count, offset + codes_size + 8 * count)
+    else:
+        codes = data[offset:offset + codes_size] if op == MIXED else op
+        a = struct.unpack_from(f"<{count}d", data, offset + codes_size)
+        b = struct.unpack_from(f"<{count}d", data, offset + codes_size + 8 * count)
+    return codes, a, b
+
+
+def batch_binary_response(results, statuses):
+    count = len(statuses)
+    if np is not None:
+        body = np.asarray(results, dtype="<f8").tobytes()
+    else:
+        body = struct.pack(f"<{count}d", *results)
+    return Response(BATCH_HEADER.pack(BATCH_MAGIC, 0, count) + body + statuses, mimetype=BINARY_TYPE)
+
+
+def batch_json_response(results, statuses):
+    results = results.tolist() if np is not None else list(results)
+    errors = []
+    for i, status in enumerate(statuses):
+        if status:
+            results[i] = None
+            errors.append({"index": i, "error": STATUS_ERRORS[status]})
+    return jsonify({"results": results, "errors": errors, "count": len(results)})
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Many operations in one request, as JSON or the compact binary format"""
+    try:
+        binary = request.mimetype == BINARY_TYPE
+        if binary:
+            codes, a, b = parse_batch_binary(request.get_data())
+        else:
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                raise ValueError("Expected a JSON object or a binary batch")
+            codes, a, b = parse_batch_json(body)
+            if len(a) > MAX_BATCH:
+                raise ValueError(f"Batch larger than {MAX_BATCH} operations")
+        results, statuses = evaluate_batch(codes, a, b)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        return jsonify({"error": "Invalid input"}), 400
+    if binary:
+        return batch_binary_response(results, statuses)
+    return batch_json_response(results, statuses)
+
+
+def _variables(mapping):
+    if not isinstance(mapping, dict):
+        raise ExpressionError("'vars' must be an object of numbers")
+    try:
+        return {name: float(value) for name, value in mapping.items()}
+    except (TypeError, ValueError):
+        raise ExpressionError("Variables must be numbers")
+
+
+def _many_response(results, errors):
+    return jsonify({"results": results, "count": len(results),
+                    "errors": [{"index": i, "error": message} for i, message in errors]})
+
+
+@app.route('/api/eval', methods=['GET', 'POST'])
+def evaluate():
+    """Arithmetic expressions with variables: ?expr=2*x+1&x=3, or a JSON body
+    with "vars" (one result), "bindings" (a list of vars) or "columns"
+    ({name: list or number}, evaluated with NumPy when available)."""
+    try:
+        if request.method == 'GET':
+            args = request.args.to_dict()
+            text = args.pop('expr', None)
+            body = {"vars": args}
+        else:
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                raise ExpressionError("Expected a JSON object")
+            text = body.get("expr")
+        if not isinstance(text, str) or not text.strip():
+            raise ExpressionError("Missing 'expr'")
+        expression = compile_expression(text)
+
+        if "bindings" in body:
+            bindings = body["bindings"]
+            if not isinstance(bindings, list) or len(bindings) > MAX_BATCH:
+                raise ExpressionError(f"'bindings' must be a list of at most {MAX_BATCH} objects")
+            return _many_response(*expression.evaluate_many([_variables(b) for b in bindings]))
+        if "columns" in body:
+            columns = body["columns"]
+            if not isinstance(columns, dict):
+                raise ExpressionError("'columns' must be an object")
+            return _many_response(*expression.evaluate_columns(columns))
+        return jsonify({"result": expression.evaluate(_variables(body.get("vars", {})))})
+    except ExpressionError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        return jsonify({"error": "Invalid input"}), 400
+
+
+@app.route('/api/eval/cache')
+def eval_cache():
+    info = compile_expression.cache_info()
+    return jsonify({"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize})
+
 @app.route('/')
 def index():
     return render_template_string("""
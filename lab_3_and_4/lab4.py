@@ -1,18 +1,33 @@
-import requests
+import random
+import sys
+import time
+
+from calc_client import CalculatorClient, CalculatorError
+
+# One client for the whole script: its connections stay open between calls
+client = CalculatorClient()
 
 def call_local_service(operation, a, b):
-    url = f"http://127.0.0.1:5000/api/{operation}"
-    params = {"a": a, "b": b}
-    response = requests.get(url, params=params)
+    try:
+        result = client.calculate(operation, a, b)
+        print(f"{operation.capitalize()}({a}, {b}) = {result}")
+    except CalculatorError as e:
+        print(f"Error calling service: {e}")
 
-    if response.status_code == 200:
-        data = response.json()
-        print(f"{operation.capitalize()}({a}, {b}) = {data['result']}")
-    else:
-        print(f"Error calling service: {response.text}")
+def run_batch(count):
+    operations = [(random.choice(["add", "subtract", "multiply", "divide"]),
+                   random.randint(-100, 100), random.randint(-10, 10)) for _ in range(count)]
+    start = time.perf_counter()
+    results, errors = client.batch(operations)
+    elapsed = time.perf_counter() - start
+    mode = "batch endpoint" if client.has_batch else "parallel calls"
+    print(f"{len(results)} operations in {elapsed:.2f}s via {mode}, {len(errors)} errors")
+    print(client.stats.summary())
 
 if __name__ == "__main__":
     call_local_service("add", 10, 5)
     call_local_service("subtract", 10, 5)
     call_local_service("multiply", 10, 5)
-    call_local_service("divide", 10, 5)
\ No newline at end of file
+    call_local_service("divide", 10, 5)
+    if len(sys.argv) > 1:
+        run_batch(int(sys.argv[1]))
@@ -0,0 +1,91 @@
+"""
+Push channel for the dashboard: one poller per key, fanned out to browsers.
+
+Each topic (bitcoin price, London weather, ...) gets a single background
+poller as soon as its first viewer subscribes and loses it when the last
+one leaves. The poller reads through the dashboard's cache and pushes the
+value to every subscriber's inbox only when it changed, so N viewers of
+the same key cost one upstream poll per interval instead of N. Inboxes are
+bounded: a browser that stops reading loses old updates, not memory.
+"""
+
+import queue
+import threading
+
+INBOX_SIZE = 32         # undelivered events kept per browser
+RETRY_INTERVAL = 15     # seconds before a failed poll is retried
+
+
+class Topic:
+    def __init__(self, event, fetch, interval):
+        self.event = event
+        self.fetch = fetch
+        self.interval = interval
+        self.inboxes = set()
+        self.last = None
+        self.stop = threading.Event()
+
+
+class Hub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.topics = {}            # key -> Topic
+        self.polls = 0
+
+    def subscribe(self, key, event, fetch, interval, inbox):
+        """Deliver (event, value) updates for `key` to `inbox`, starting its poller if needed"""
+        with self.lock:
+            topic = self.topics.get(key)
+            if topic is None:
+                topic = self.topics[key] = Topic(event, fetch, interval)
+                threading.Thread(target=self.poll, args=(topic,), name=f"poll-{event}",
+                                 daemon=True).start()
+            topic.inboxes.add(inbox)
+            last = topic.last
+        if last is not None:
+            self.deliver(inbox, (topic.event, last))   # new viewers see the current value at once
+
+    def unsubscribe(self, key, inbox):
+        with self.lock:
+            topic = self.topics.get(key)
+            if topic is None:
+                return
+            topic.inboxes.discard(inbox)
+            if not topic.inboxes:
+                del self.topics[key]
+                topic.stop.set()
+
+    @staticmethod
+    def deliver(inbox, item):
+        while True:
+            try:
+                inbox.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    inbox.get_nowait()      # drop the oldest update for a slow reader
+                except queue.Empty:
+                    pass
+
+    def poll(self, topic):
+        while not topic.stop.is_set():
+            try:
+                value = topic.fetch()
+                ok = value.get('success', True)
+            except Exception:
+                value, ok = None, False
+            with self.lock:
+                self.polls += 1
+                changed = ok and value != topic.last
+                if changed:
+                    topic.last = value
+                inboxes = list(topic.inboxes)
+            if changed:
+                for inbox in inboxes:
+                    self.deliver(inbox, (topic.event, value))
+            topic.stop.wait(topic.interval if ok else min(topic.interval, RETRY_INTERVAL))
+
+    def stats(self):
+        with self.lock:
+            return {'topics': len(self.topics), 'polls': self.polls,
+                    'subscribers': sum(len(topic.inboxes) for topic in self.topics.values())}
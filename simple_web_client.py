@@ -149,33 +149,37 @@ class SimpleWebServicesClient:
             print(f"  {i}. {crypto.title()}")
         
         try:
-            choice = input("\nEnter number (1-5) or cryptocurrency name: ").strip().lower()
+            choices = input("\nEnter numbers (1-5) or names, comma-separated: ").strip().lower()
             
-            if choice.isdigit() and 1 <= int(choice) <= 5:
-                crypto = cryptos[int(choice) - 1]
-            elif choice in cryptos:
-                crypto = choice
-            else:
-                crypto = choice if choice else "bitcoin"
+            selected = []
+            for choice in choices.split(",") if choices else ["bitcoin"]:
+                choice = choice.strip()
+                if choice.isdigit() and 1 <= int(choice) <= 5:
+                    choice = cryptos[int(choice) - 1]
+                if choice and choice not in selected:
+                    selected.append(choice)
             
-            print(f"🔄 Fetching {crypto} price...")
+            print(f"🔄 Fetching {', '.join(selected)} price(s)...")
             
-            url = f"https://api.coingecko.com/api/v3/simple/price?ids={crypto}&vs_currencies=usd&include_24hr_change=true"
+            # simple/price takes many ids at once: one request for all of them
+            ids = ",".join(selected)
+            url = f"https://api.coingecko.com/api/v3/simple/price?ids={ids}&vs_currencies=usd&include_24hr_change=true"
             response = requests.get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
                 
-                if crypto in data:
-                    price_data = data[crypto]
-                    price = price_data.get('usd', 0)
-                    change = price_data.get('usd_24h_change', 0)
-                    
-                    change_emoji = "📈" if change > 0 else "📉"
-                    print(f"\n💰 {crypto.title()}: ${price:,.2f}")
-                    print(f"{change_emoji} 24h Change: {change:.2f}%")
-                else:
-                    print(f"❌ No data found for '{crypto}'")
+                for crypto in selected:
+                    if crypto in data:
+                        price_data = data[crypto]
+                        price = price_data.get('usd', 0)
+                        change = price_data.get('usd_24h_change', 0)
+                        
+                        change_emoji = "📈" if change > 0 else "📉"
+                        print(f"\n💰 {crypto.title()}: ${price:,.2f}")
+                        print(f"{change_emoji} 24h Change: {change:.2f}%")
+                    else:
+                        print(f"❌ No data found for '{crypto}'")
             else:
                 print("❌ Could not fetch crypto data")
                 
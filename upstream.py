@@ -0,0 +1,168 @@
+"""
+Shared HTTP client for the dashboard's upstream APIs.
+
+All fetches go through one requests Session whose adapter keeps a pool
+of keep-alive connections per upstream host, so a request reuses an open
+TLS connection instead of doing a fresh handshake. The pool is sized for
+cooperative workers (gunicorn.conf.py runs gevent workers when gevent is
+installed), where one process has hundreds of upstream requests in flight.
+fan_out() queries several upstreams at once for the aggregate endpoint.
+
+Each host also has a Health tracker: its timeout follows the observed p99
+latency instead of a flat 10 s, and when most recent calls fail its
+circuit opens, so requests fail at once (the cache then serves stale data)
+rather than tying up workers. After a cool-down one probe request is let
+through; its outcome closes the circuit or opens it again.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TIMEOUT = 10
+POOL_HOSTS = 16         # hosts with a pool of their own
+POOL_SIZE = 100         # kept-alive connections per host, also fan-out threads
+
+WINDOW = 50             # recent calls per host the health stats are based on
+MIN_SAMPLES = 10        # calls needed before timeouts adapt or the circuit can open
+MIN_TIMEOUT = 1.0
+TIMEOUT_FACTOR = 3      # adaptive timeout = p99 latency x this, within [MIN_TIMEOUT, TIMEOUT]
+ERROR_RATE = 0.5        # failure share of the window that opens the circuit
+COOL_DOWN = 30          # seconds an open circuit fails fast before a probe
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Health:
+    """Rolling latency/error stats and circuit breaker for one upstream host"""
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.calls = deque(maxlen=WINDOW)   # (ok, seconds)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+
+    def _p99(self):
+        latencies = sorted(seconds for ok, seconds in self.calls if ok)
+        return latencies[int(0.99 * (len(latencies) - 1))] if latencies else None
+
+    def timeout(self):
+        with self.lock:
+            p99 = self._p99() if len(self.calls) >= MIN_SAMPLES else None
+        if p99 is None:
+            return TIMEOUT
+        return min(TIMEOUT, max(MIN_TIMEOUT, p99 * TIMEOUT_FACTOR))
+
+    def allow(self):
+        """Whether a request may go out now (False = fail fast)"""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= COOL_DOWN:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True     # exactly one probe while half-open
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok, seconds):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+                if ok:
+                    self.state = CLOSED
+                    self.calls.clear()
+                else:
+                    self.state, self.opened_at = OPEN, time.monotonic()
+                    return
+            self.calls.append((ok, seconds))
+            failures = sum(1 for ok, _ in self.calls if not ok)
+            if (self.state == CLOSED and len(self.calls) >= MIN_SAMPLES
+                    and failures >= ERROR_RATE * len(self.calls)):
+                self.state, self.opened_at = OPEN, time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            calls = len(self.calls)
+            failures = sum(1 for ok, _ in self.calls if not ok)
+            p99 = self._p99()
+            state, rejected = self.state, self.rejected
+        return {'state': state, 'calls': calls, 'error_rate': round(failures / calls, 3) if calls else 0,
+                'p99_ms': round(p99 * 1000) if p99 is not None else None,
+                'timeout': round(self.timeout(), 2), 'rejected': rejected}
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def health_for(host):
+    with _health_lock:
+        if host not in _health:
+            _health[host] = Health(host)
+        return _health[host]
+
+
+def health_stats():
+    with _health_lock:
+        hosts = list(_health.values())
+    return {health.host: health.stats() for health in hosts}
+
+session = requests.Session()
+session.headers['User-Agent'] = 'web-services-dashboard'
+_adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
+_executor = ThreadPoolExecutor(POOL_SIZE, thread_name_prefix='upstream')
+
+
+def get_json(url, timeout=None, **params):
+    """Decoded JSON body of a GET; raises on HTTP errors, timeouts and open circuits.
+
+    `timeout` defaults to the host's adaptive timeout.
+    """
+    health = health_for(urlsplit(url).netloc)
+    if not health.allow():
+        raise CircuitOpen(f"{health.host} is unavailable")
+    start = time.monotonic()
+    try:
+        response = session.get(url, params=params or None, timeout=timeout or health.timeout())
+    except requests.RequestException:
+        health.record(False, time.monotonic() - start)
+        raise
+    # Client errors (unknown city, bad coin id) say nothing about the host's health
+    health.record(response.status_code < 500 and response.status_code != 429, time.monotonic() - start)
+    response.raise_for_status()
+    return response.json()
+
+
+def fan_out(jobs, deadlines, default_deadline=TIMEOUT):
+    """Run {name: callable} concurrently; {name: result} for those done in time.
+
+    Each job has its own deadline in seconds (from `deadlines`, counted
+    from the call). Jobs that fail or miss their deadline are left out of
+    the result; ones that are late keep running in the background.
+    """
+    start = time.monotonic()
+    futures = {name: _executor.submit(job) for name, job in jobs.items()}
+    results = {}
+    for name in sorted(futures, key=lambda n: deadlines.get(n, default_deadline)):
+        remaining = start + deadlines.get(name, default_deadline) - time.monotonic()
+        try:
+            results[name] = futures[name].result(timeout=max(0, remaining))
+        except Exception:       # timed out, or the job raised
+            pass
+    return results
@@ -4,94 +4,214 @@ Simple Web Services Dashboard - Flask Web Interface
 A clean web app that connects to multiple free public APIs
 """
 
-from flask import Flask, render_template, request, jsonify
-import requests
+from flask import Flask, render_template, request, jsonify, Response
 import json
 import os
-from datetime import datetime
+import queue
+
+import upstream
+from crypto_prices import PriceBatcher
+from dashboard_cache import Refresher, TTLCache
+from live_updates import INBOX_SIZE, Hub
 
 app = Flask(__name__)
 
+# Seconds an upstream answer is served from the cache. Quotes and facts are
+# random anyway, so page loads a few seconds apart may share one.
+TTLS = {'weather': 600, 'quote': 10, 'fact': 10, 'crypto': 30}
+# Further seconds an expired answer is still served (and refreshed behind
+# the scenes); during an upstream outage this is how stale data can get
+STALE = {'weather': 3600, 'quote': 300, 'fact': 300, 'crypto': 600}
+# Seconds /api/dashboard waits for each source before replying without it
+DEADLINES = {'weather': 4, 'quote': 3, 'fact': 3, 'crypto': 4}
+MAX_CRYPTO_IDS = 50
+cache = TTLCache()
+refresher = Refresher(cache)
+crypto_batcher = PriceBatcher()
+# Seconds between polls behind /api/stream: half the TTL, so pushed
+# values are at most one interval behind the cache
+STREAM_INTERVALS = {'weather': 300, 'crypto': 15}
+KEEPALIVE = 15          # seconds between SSE comments that detect closed browsers
+hub = Hub()
+
 @app.route('/')
 def home():
     """Main dashboard page"""
-    return render_template('dashboard.html')
+    return render_template('dashboard.html', live_updates=streaming_enabled())
+
+def streaming_enabled():
+    """Whether /api/stream may hold connections open.
+
+    Each stream occupies its worker for as long as the page is open, which
+    only a gevent worker can afford; on sync/gthread workers a handful of
+    viewers would block every other endpoint. DASHBOARD_STREAM=1/0 overrides.
+    """
+    setting = os.environ.get('DASHBOARD_STREAM')
+    if setting is not None:
+        return setting != '0'
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+def fetch_weather(city):
+    current = upstream.get_json(f"https://wttr.in/{city}?format=j1")['current_condition'][0]
+    return {
+        'success': True,
+        'city': city,
+        'temp': current['temp_C'],
+        'desc': current['weatherDesc'][0]['value'],
+        'humidity': current['humidity'],
+        'wind': current['windspeedKmph']
+    }
+
+def fetch_quote():
+    data = upstream.get_json("https://api.quotable.io/random?minLength=30")
+    return {
+        'success': True,
+        'quote': data['content'],
+        'author': data['author']
+    }
+
+def fetch_fact():
+    data = upstream.get_json("https://uselessfacts.jsph.pl/random.json?language=en")
+    return {
+        'success': True,
+        'fact': data['text']
+    }
+
+def fetch_crypto(crypto):
+    price_data = crypto_batcher.get(crypto)
+    return {
+        'success': True,
+        'crypto': crypto,
+        'price': price_data['usd'],
+        'change': price_data.get('usd_24h_change', 0)
+    }
+
+def cached(source, key, fetch, error):
+    """Reply from the cache, fetching (once per burst) on a miss"""
+    try:
+        return cache.get_or_fetch((source, key), fetch, TTLS[source], STALE[source])
+    except Exception:
+        return {'success': False, 'error': error}
+
+def weather(city):
+    return cached('weather', city.strip().lower(), lambda: fetch_weather(city), 'Could not fetch weather')
+
+def quote():
+    return cached('quote', None, fetch_quote, 'Could not fetch quote')
+
+def fact():
+    return cached('fact', None, fetch_fact, 'Could not fetch fact')
+
+def crypto_price(crypto):
+    return cached('crypto', crypto, lambda: fetch_crypto(crypto), 'Could not fetch crypto data')
+
+def crypto_prices(ids):
+    """{id: reply like /api/crypto}, all misses sharing one batched upstream call"""
+    prices = upstream.fan_out({crypto: lambda crypto=crypto: crypto_price(crypto) for crypto in ids},
+                              {crypto: DEADLINES['crypto'] for crypto in ids})
+    return {crypto: prices.get(crypto, {'success': False, 'error': 'Service took too long'})
+            for crypto in ids}
 
 @app.route('/api/weather')
 def get_weather():
     """Get weather data"""
-    city = request.args.get('city', 'London')
-    try:
-        url = f"https://wttr.in/{city}?format=j1"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            current = data['current_condition'][0]
-            return jsonify({
-                'success': True,
-                'city': city,
-                'temp': current['temp_C'],
-                'desc': current['weatherDesc'][0]['value'],
-                'humidity': current['humidity'],
-                'wind': current['windspeedKmph']
-            })
-    except:
-        pass
-    return jsonify({'success': False, 'error': 'Could not fetch weather'})
+    return jsonify(weather(request.args.get('city', 'London')))
 
 @app.route('/api/quote')
 def get_quote():
     """Get inspirational quote"""
-    try:
-        url = "https://api.quotable.io/random?minLength=30"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return jsonify({
-                'success': True,
-                'quote': data['content'],
-                'author': data['author']
-            })
-    except:
-        pass
-    return jsonify({'success': False, 'error': 'Could not fetch quote'})
+    return jsonify(quote())
 
 @app.route('/api/fact')
 def get_fact():
     """Get random fact"""
-    try:
-        url = "https://uselessfacts.jsph.pl/random.json?language=en"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return jsonify({
-                'success': True,
-                'fact': data['text']
-            })
-    except:
-        pass
-    return jsonify({'success': False, 'error': 'Could not fetch fact'})
+    return jsonify(fact())
 
 @app.route('/api/crypto')
 def get_crypto():
-    """Get crypto price"""
+    """Get crypto price, or several with ?ids=bitcoin,ethereum"""
+    if 'ids' not in request.args:
+        return jsonify(crypto_price(request.args.get('crypto', 'bitcoin')))
+    ids = list(dict.fromkeys(i.strip().lower() for i in request.args['ids'].split(',') if i.strip()))
+    if not ids or len(ids) > MAX_CRYPTO_IDS:
+        return jsonify({'success': False, 'error': f'Give 1 to {MAX_CRYPTO_IDS} comma-separated ids'})
+    return jsonify({'success': True, 'prices': crypto_prices(ids)})
+
+@app.route('/api/dashboard')
+def get_dashboard():
+    """All four services in one reply, queried in parallel"""
+    city = request.args.get('city', 'London')
     crypto = request.args.get('crypto', 'bitcoin')
-    try:
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={crypto}&vs_currencies=usd&include_24hr_change=true"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if crypto in data:
-                price_data = data[crypto]
-                return jsonify({
-                    'success': True,
-                    'crypto': crypto,
-                    'price': price_data['usd'],
-                    'change': price_data.get('usd_24h_change', 0)
-                })
-    except:
-        pass
-    return jsonify({'success': False, 'error': 'Could not fetch crypto data'})
+    results = upstream.fan_out({
+        'weather': lambda: weather(city),
+        'quote': quote,
+        'fact': fact,
+        'crypto': lambda: crypto_price(crypto),
+    }, DEADLINES)
+    for source in DEADLINES:
+        results.setdefault(source, {'success': False, 'error': 'Service took too long'})
+    return jsonify(results)
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: ?crypto=bitcoin,ethereum&city=London push 'crypto'
+    and 'weather' events (same data as the JSON endpoints) whenever they change"""
+    if not streaming_enabled():
+        return jsonify({'success': False, 'error': 'Live updates need gevent workers'}), 503
+    topics = {}
+    for crypto in request.args.get('crypto', '').split(',')[:MAX_CRYPTO_IDS]:
+        crypto = crypto.strip().lower()
+        if crypto:
+            topics[('crypto', crypto)] = ('crypto', lambda crypto=crypto: crypto_price(crypto))
+    city = request.args.get('city', '').strip()
+    if city:
+        topics[('weather', city.lower())] = ('weather', lambda: weather(city))
+    if not topics:
+        return jsonify({'success': False, 'error': 'Nothing to stream: give crypto and/or city'}), 400
+
+    def events():
+        inbox = queue.Queue(INBOX_SIZE)
+        for key, (event, fetch) in topics.items():
+            hub.subscribe(key, event, fetch, STREAM_INTERVALS[event], inbox)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = inbox.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            # The browser went away (the server closes the generator)
+            for key in topics:
+                hub.unsubscribe(key, inbox)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/cache')
+def cache_stats():
+    """Upstream cache hit/miss counters"""
+    return jsonify({**cache.stats(), 'crypto_batches': crypto_batcher.stats(), 'streams': hub.stats()})
+
+@app.route('/api/health')
+def upstream_health():
+    """Circuit state, error rate, p99 latency and current timeout per upstream host"""
+    return jsonify(upstream.health_stats())
+
+def keep_fresh(source, key, fetch):
+    refresher.add((source, key), fetch, TTLS[source], STALE[source])
+
+# The default dashboard keys are fetched ahead of expiry, never by a visitor
+keep_fresh('weather', 'london', lambda: fetch_weather('London'))
+keep_fresh('crypto', 'bitcoin', lambda: fetch_crypto('bitcoin'))
+if os.environ.get('DASHBOARD_REFRESH', '1') != '0':
+    refresher.start()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))